@@ -0,0 +1,166 @@
+"""Кэш страниц с инвалидацией по поколениям.
+
+У каждой области данных (все посты, группа, автор) есть счётчик
+поколения. Запись в область увеличивает счётчик, а ключ закэшированной
+страницы содержит текущие поколения её областей, поэтому после записи
+страница сразу собирается заново, а без записей живёт сколько угодно.
+
+Вместе с поколением запоминается время последней записи в область:
+из него и поколений строятся Last-Modified и ETag для условного GET.
+"""
+import hashlib
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from functools import wraps
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.cache import cache_page
+from django.views.decorators.http import condition
+
+GENERATION_PREFIX = 'generation:'
+MODIFIED_PREFIX = 'modified:'
+
+
+def _fresh_generation():
+    # Потерянный (вытесненный) счётчик не должен вернуться к старому
+    # значению, иначе оживут страницы, собранные до последней записи.
+    return int(time.time() * 1000)
+
+
+def generations(*scopes):
+    """Текущие поколения областей одним обращением к кэшу."""
+    keys = [GENERATION_PREFIX + scope for scope in scopes]
+    values = cache.get_many(keys)
+    for key in keys:
+        if key not in values:
+            cache.add(key, _fresh_generation(), None)
+            values[key] = cache.get(key)
+    return [values[key] for key in keys]
+
+
+def bump(*scopes):
+    """Начинает новое поколение у каждой из областей.
+
+    Внутри транзакции поколение начинается ещё раз после коммита: иначе
+    страница, которую другой воркер собрал до коммита, жила бы под новым
+    поколением. Сразу — чтобы своя транзакция не читала старый кэш.
+    """
+    _bump(scopes)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: _bump(scopes))
+
+
+def _bump(scopes):
+    for scope in scopes:
+        key = GENERATION_PREFIX + scope
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _fresh_generation(), None)
+    now = time.time()
+    cache.set_many({MODIFIED_PREFIX + scope: now for scope in scopes}, None)
+
+
+def last_modified(*scopes):
+    """Время последней записи в любую из областей."""
+    keys = [MODIFIED_PREFIX + scope for scope in scopes]
+    values = cache.get_many(keys)
+    for key in keys:
+        if key not in values:
+            # Время потеряно: считаем, что область изменилась сейчас.
+            cache.add(key, time.time(), None)
+            values[key] = cache.get(key)
+    return datetime.fromtimestamp(max(values.values()), timezone.utc)
+
+
+@contextmanager
+def as_anonymous(request):
+    """На время блока request.user — аноним."""
+    user = request.user
+    request.user = AnonymousUser()
+    try:
+        yield
+    finally:
+        request.user = user
+
+
+def cache_page_by_generations(timeout, scopes, shared=False):
+    """cache_page, ключ которого включает поколения областей.
+
+    scopes получает аргументы view из URL и возвращает список областей:
+    @cache_page_by_generations(60, lambda slug: [f'group:{slug}'])
+
+    Страница авторизованного пользователя кэшируется под его собственным
+    ключом. shared=True — одна копия на всех: view рендерится как для
+    анонима, а персональное на страницу вставляют дыры (core.holes).
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            names = scopes(*args, **kwargs)
+            parts = [
+                f'{name}:{generation}'
+                for name, generation in zip(names, generations(*names))
+            ]
+            authenticated = request.user.is_authenticated
+            if authenticated and not shared:
+                parts.append(f'user:{request.user.pk}')
+            cached_view = cache_page(timeout, key_prefix='.'.join(parts))(
+                view
+            )
+            if authenticated and shared:
+                with as_anonymous(request):
+                    return cached_view(request, *args, **kwargs)
+            return cached_view(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def condition_by_generations(scopes, shared_max_age):
+    """Условный GET для HTML-страниц по поколениям областей.
+
+    ETag строится из адреса, пользователя и поколений, Last-Modified —
+    из времени последней записи. Анонимные ответы можно хранить на CDN
+    shared_max_age секунд, ответы пользователям — только в браузере и
+    со сверкой при каждом показе.
+    """
+    def etag(request, *args, **kwargs):
+        names = scopes(*args, **kwargs)
+        parts = [request.get_full_path(), str(request.user.pk)] + [
+            f'{name}:{generation}'
+            for name, generation in zip(names, generations(*names))
+        ]
+        return hashlib.md5('|'.join(parts).encode()).hexdigest()
+
+    def modified(request, *args, **kwargs):
+        return last_modified(*scopes(*args, **kwargs))
+
+    def decorator(view):
+        conditional = condition(etag_func=etag, last_modified_func=modified)(
+            view
+        )
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional(request, *args, **kwargs)
+            # cache_page выставляет max-age на весь срок серверного кэша,
+            # а страница устаревает с первой же записью.
+            if response.has_header('Expires'):
+                del response['Expires']
+            if request.user.is_authenticated:
+                patch_cache_control(
+                    response, private=True, no_cache=True, max_age=0
+                )
+            else:
+                patch_cache_control(
+                    response, public=True, max_age=0,
+                    s_maxage=shared_max_age,
+                )
+            patch_vary_headers(response, ('Cookie',))
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,270 @@
+"""Двухуровневый кэш: локальный LRU процесса поверх общего кэша.
+
+L1 живёт в памяти процесса (общий для всех потоков воркера), L2 —
+любой кэш из settings.CACHES, общий для всех воркеров (memcached,
+Redis, файловый кэш). В CACHES указывается так:
+
+    'default': {
+        'BACKEND': 'core.cache_backends.TieredCache',
+        'LOCATION': 'shared',  # алиас кэша второго уровня
+        'OPTIONS': {'L1_MAX_ENTRIES': 1000, 'L1_TIMEOUT': 30},
+    }
+
+Каждая запись через TieredCache публикуется в журнале инвалидаций в
+L2. Перед чтением воркер догоняет журнал, но не чаще SYNC_INTERVAL
+секунд (по умолчанию 1), и выбрасывает из своего L1 изменённые другими
+воркерами ключи. Значит, запись другого воркера видна не позже чем
+через SYNC_INTERVAL секунд, а свои записи — сразу. SYNC_INTERVAL 0
+даёт точную согласованность ценой обращения к L2 на каждое чтение, и
+тогда L1 почти ничего не экономит. Если журнал потерян или воркер
+отстал больше чем на LOG_SIZE записей, L1 очищается целиком.
+
+KEY_PREFIX, VERSION и KEY_FUNCTION берутся у кэша L2: через TieredCache
+и напрямую через алиас L2 видны одни и те же ключи.
+"""
+import pickle
+import random
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from .profiling import profiled
+
+SEQUENCE_KEY = 'tiered:sequence'
+LOG_KEY = 'tiered:log:%d'
+CLEAR_ALL = '*'
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+class LocalStore:
+    """L1 одного процесса: LRU с TTL и позицией в журнале инвалидаций."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.sequence = None
+        self.synced_at = 0
+        self.published = set()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + timeout, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def discard(self, keys):
+        with self.lock:
+            for key in keys:
+                self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class TieredCache(BaseCache):
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.shared_alias = location
+        shared = self.shared
+        self.key_prefix = shared.key_prefix
+        self.version = shared.version
+        self.key_func = shared.key_func
+        self.l1_timeout = int(options.get('L1_TIMEOUT', 30))
+        self.sync_interval = float(options.get('SYNC_INTERVAL', 1))
+        self.log_size = int(options.get('LOG_SIZE', 1000))
+        self.log_timeout = int(options.get('LOG_TIMEOUT', 300))
+        with _stores_lock:
+            self.local = _stores.setdefault(
+                location, LocalStore(int(options.get('L1_MAX_ENTRIES', 1000)))
+            )
+
+    @property
+    def shared(self):
+        return caches[self.shared_alias]
+
+    # Журнал инвалидаций
+
+    def _publish(self, *keys):
+        try:
+            sequence = self.shared.incr(SEQUENCE_KEY)
+        except ValueError:
+            # Новый журнал начинается со случайного номера, чтобы воркеры
+            # не приняли его за продолжение потерянного и сбросили L1.
+            self.shared.add(SEQUENCE_KEY, random.getrandbits(48), None)
+            sequence = self.shared.incr(SEQUENCE_KEY)
+        # Записи журнала лежат в L2 без версий: ключи в них уже полные.
+        self.shared.set(LOG_KEY % sequence, list(keys), self.log_timeout)
+        self.local.published.add(sequence)
+
+    def _sync(self):
+        local = self.local
+        now = time.monotonic()
+        if now - local.synced_at < self.sync_interval:
+            return
+        local.synced_at = now
+        sequence = self.shared.get(SEQUENCE_KEY)
+        if sequence == local.sequence:
+            return
+        changed = None
+        if (
+            sequence is not None and local.sequence is not None
+            and 0 < sequence - local.sequence <= self.log_size
+        ):
+            numbers = [
+                number
+                for number in range(local.sequence + 1, sequence + 1)
+                if number not in local.published
+            ]
+            records = self.shared.get_many(
+                [LOG_KEY % number for number in numbers]
+            )
+            if len(records) == len(numbers):
+                changed = set()
+                for keys in records.values():
+                    changed.update(keys)
+        if changed is None or CLEAR_ALL in changed:
+            local.clear()
+        else:
+            local.discard(changed)
+        local.sequence = sequence
+        local.published.clear()
+
+    def _remember(self, key, value, timeout):
+        if timeout == DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        l1_timeout = self.l1_timeout
+        if timeout is not None:
+            if timeout <= 0:
+                return
+            l1_timeout = min(timeout, l1_timeout)
+        pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        self.local.set(key, pickled, l1_timeout)
+
+    # API кэша
+
+    @profiled('cache')
+    def get(self, key, default=None, version=None):
+        full_key = self.make_key(key, version)
+        self.validate_key(full_key)
+        self._sync()
+        pickled = self.local.get(full_key)
+        if pickled is not None:
+            return pickle.loads(pickled)
+        value = self.shared.get(key, self, version)
+        if value is self:
+            return default
+        self._remember(full_key, value, DEFAULT_TIMEOUT)
+        return value
+
+    @profiled('cache')
+    def get_many(self, keys, version=None):
+        self._sync()
+        found = {}
+        missing = []
+        for key in keys:
+            full_key = self.make_key(key, version)
+            self.validate_key(full_key)
+            pickled = self.local.get(full_key)
+            if pickled is None:
+                missing.append(key)
+            else:
+                found[key] = pickle.loads(pickled)
+        if missing:
+            fetched = self.shared.get_many(missing, version=version)
+            for key, value in fetched.items():
+                self._remember(
+                    self.make_key(key, version), value, DEFAULT_TIMEOUT
+                )
+            found.update(fetched)
+        return found
+
+    @profiled('cache')
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        full_key = self.make_key(key, version)
+        self.validate_key(full_key)
+        self.shared.set(key, value, timeout, version)
+        self._publish(full_key)
+        self._remember(full_key, value, timeout)
+
+    @profiled('cache')
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        full_key = self.make_key(key, version)
+        self.validate_key(full_key)
+        if not self.shared.add(key, value, timeout, version):
+            return False
+        self._publish(full_key)
+        self._remember(full_key, value, timeout)
+        return True
+
+    @profiled('cache')
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.shared.set_many(data, timeout, version)
+        full_keys = {key: self.make_key(key, version) for key in data}
+        self._publish(*full_keys.values())
+        for key, value in data.items():
+            if key not in failed:
+                self._remember(full_keys[key], value, timeout)
+        return failed
+
+    @profiled('cache')
+    def incr(self, key, delta=1, version=None):
+        full_key = self.make_key(key, version)
+        self.validate_key(full_key)
+        value = self.shared.incr(key, delta, version)
+        self._publish(full_key)
+        self._remember(full_key, value, DEFAULT_TIMEOUT)
+        return value
+
+    @profiled('cache')
+    def delete(self, key, version=None):
+        full_key = self.make_key(key, version)
+        self.validate_key(full_key)
+        self.shared.delete(key, version)
+        self.local.discard([full_key])
+        self._publish(full_key)
+
+    @profiled('cache')
+    def delete_many(self, keys, version=None):
+        self.shared.delete_many(keys, version)
+        full_keys = [self.make_key(key, version) for key in keys]
+        self.local.discard(full_keys)
+        self._publish(*full_keys)
+
+    @profiled('cache')
+    def has_key(self, key, version=None):
+        return self.get(key, self, version) is not self
+
+    @profiled('cache')
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, timeout, version)
+
+    @profiled('cache')
+    def clear(self):
+        self.shared.clear()
+        self.local.clear()
+        self._publish(CLEAR_ALL)
+
+    def close(self, **kwargs):
+        self.shared.close(**kwargs)
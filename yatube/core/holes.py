@@ -0,0 +1,75 @@
+"""Дыры в общем кэше страниц (hole punching).
+
+Страница рендерится и кэшируется одна на всех, без обращения к
+пользователю. На месте персональных кусков тег {% hole 'имя' %}
+оставляет метку-комментарий, а HolePunchMiddleware перед отправкой
+заменяет метки фрагментами holes/<имя>.html, отрендеренными уже для
+текущего запроса. Так кэш страницы попадает и у авторизованных.
+
+Контекст фрагмента — параметры метки и, если для имени
+зарегистрирована функция через @register, то, что она вернёт.
+"""
+import re
+from urllib.parse import parse_qsl, urlencode
+
+from django.template.loader import render_to_string
+
+MARKER = '<!--hole:{name}{params}-->'
+MARKER_RE = re.compile(r'<!--hole:(?P<name>\w+)(?:\?(?P<params>[^>]*))?-->')
+TEMPLATE = 'holes/{name}.html'
+
+_registry = {}
+
+
+def register(name):
+    """Регистрирует функцию контекста фрагмента: f(request, **params)."""
+    def decorator(func):
+        _registry[name] = func
+        return func
+    return decorator
+
+
+def marker(name, **params):
+    query = '?' + urlencode(params) if params else ''
+    return MARKER.format(name=name, params=query)
+
+
+def render_hole(request, name, params):
+    context = dict(params)
+    if name in _registry:
+        context.update(_registry[name](request, **params))
+    return render_to_string(
+        TEMPLATE.format(name=name), context, request=request
+    )
+
+
+def fill(request, content):
+    return MARKER_RE.sub(
+        lambda match: render_hole(
+            request,
+            match.group('name'),
+            dict(parse_qsl(match.group('params') or '')),
+        ),
+        content,
+    )
+
+
+class HolePunchMiddleware:
+    """Заполняет дыры в HTML-ответах, в том числе взятых из кэша."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (
+            response.streaming
+            or 'text/html' not in response.get('Content-Type', '')
+            or b'<!--hole:' not in response.content
+        ):
+            return response
+        content = response.content.decode(response.charset)
+        response.content = fill(request, content).encode(response.charset)
+        if response.has_header('Content-Length'):
+            response['Content-Length'] = len(response.content)
+        return response
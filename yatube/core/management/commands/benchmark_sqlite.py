@@ -0,0 +1,120 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.sqlite import apply_pragmas
+
+SCHEMA = (
+    'CREATE TABLE post ('
+    'id INTEGER PRIMARY KEY, author_id INTEGER NOT NULL, '
+    'text TEXT NOT NULL, pub_date REAL NOT NULL)',
+    'CREATE INDEX post_pub_date ON post (pub_date, id)',
+)
+READ = 'SELECT id, author_id, text FROM post ORDER BY pub_date DESC, id DESC '
+READ += 'LIMIT 10'
+WRITE = 'INSERT INTO post (author_id, text, pub_date) VALUES (?, ?, ?)'
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пропускную способность читателей и писателей SQLite '
+        'с настройками по умолчанию и с settings.SQLITE_PRAGMAS'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seconds', type=float, default=5)
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument('--rows', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        modes = (('по умолчанию', {}), ('SQLITE_PRAGMAS', dict(
+            settings.SQLITE_PRAGMAS
+        )))
+        self.stdout.write(
+            f'{"режим":<16}{"чтений/с":>10}{"записей/с":>11}'
+            f'{"макс. запись, мс":>18}{"ошибок":>8}'
+        )
+        for name, pragmas in modes:
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, 'benchmark.sqlite3')
+                result = self.run(path, pragmas, options)
+            self.stdout.write(
+                f'{name:<16}{result["reads"]:>10.0f}{result["writes"]:>11.0f}'
+                f'{result["max_write_ms"]:>18.1f}{result["errors"]:>8}'
+            )
+
+    def connect(self, path, pragmas):
+        # Как у Django: автокоммит и таймаут sqlite3 по умолчанию (5 с).
+        connection = sqlite3.connect(
+            path, isolation_level=None, check_same_thread=False
+        )
+        apply_pragmas(connection, pragmas)
+        return connection
+
+    def seed(self, path, pragmas, rows):
+        connection = self.connect(path, pragmas)
+        for statement in SCHEMA:
+            connection.execute(statement)
+        now = time.time()
+        connection.execute('BEGIN')
+        connection.executemany(WRITE, (
+            (number % 100, 'Текст поста ' * 10, now - number)
+            for number in range(rows)
+        ))
+        connection.execute('COMMIT')
+        connection.close()
+
+    def worker(self, path, pragmas, kind, stop, record):
+        connection = self.connect(path, pragmas)
+        while not stop.is_set():
+            started = time.perf_counter()
+            try:
+                if kind == 'reads':
+                    connection.execute(READ).fetchall()
+                else:
+                    # Одна запись — одна транзакция, как в post_create.
+                    connection.execute(WRITE, (1, 'Новый пост', time.time()))
+            except sqlite3.OperationalError:
+                record('errors', 0)
+            else:
+                record(kind, time.perf_counter() - started)
+        connection.close()
+
+    def run(self, path, pragmas, options):
+        self.seed(path, pragmas, options['rows'])
+        counts = {'reads': 0, 'writes': 0, 'errors': 0, 'max_write': 0}
+        lock = threading.Lock()
+        stop = threading.Event()
+
+        def record(key, elapsed):
+            with lock:
+                counts[key] += 1
+                if key == 'writes':
+                    counts['max_write'] = max(counts['max_write'], elapsed)
+
+        kinds = ['reads'] * options['readers']
+        kinds += ['writes'] * options['writers']
+        threads = [
+            threading.Thread(
+                target=self.worker, args=(path, pragmas, kind, stop, record)
+            )
+            for kind in kinds
+        ]
+        for thread in threads:
+            thread.start()
+        time.sleep(options['seconds'])
+        stop.set()
+        for thread in threads:
+            thread.join()
+        return {
+            'reads': counts['reads'] / options['seconds'],
+            'writes': counts['writes'] / options['seconds'],
+            'max_write_ms': counts['max_write'] * 1000,
+            'errors': counts['errors'],
+        }
@@ -0,0 +1,28 @@
+import sqlite3
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from core.replicas import REPLICA
+
+
+class Command(BaseCommand):
+    help = (
+        'Копирует основную SQLite-базу в реплику: локальная замена '
+        'репликации для проверки чтения с реплики'
+    )
+
+    def handle(self, *args, **options):
+        if REPLICA not in connections.databases:
+            raise CommandError('Реплика не настроена (DB_REPLICA_NAME)')
+        primary = connections['default']
+        target = connections.databases[REPLICA]
+        if primary.vendor != 'sqlite' or 'sqlite3' not in target['ENGINE']:
+            raise CommandError('Копировать можно только SQLite в SQLite')
+        primary.ensure_connection()
+        replica = sqlite3.connect(target['NAME'])
+        try:
+            primary.connection.backup(replica)
+        finally:
+            replica.close()
+        self.stdout.write(f'Реплика обновлена: {target["NAME"]}')
@@ -0,0 +1,277 @@
+"""Выборочное профилирование запросов.
+
+ProfilingMiddleware профилирует долю запросов settings.PROFILING_SAMPLE_RATE:
+время делится на части (SQL, шаблоны, превью, кэш, остальное), считаются
+запросы к базе и повторы одного и того же запроса (отпечаток — SQL без
+параметров и чисел), чаще всего это N+1. Время частей не пересекается:
+запрос к базе изнутри шаблона засчитывается базе, а не шаблону.
+
+Фоновые задачи (нарезка превью в пуле после ответа) в замер запроса
+не попадают: декоратор task профилирует их с той же долей отдельно, под
+именем task:<имя>. Часть thumbnail у запроса ненулевая, только когда
+превью режутся прямо в нём (THUMBNAIL_WORKERS = 0).
+
+Последние PROFILING_BUFFER_SIZE замеров лежат в кольцевом буфере
+процесса, а суммы по view копятся с его запуска. Их отдают только
+персоналу /profiling/ (JSON) и /profiling/metrics (формат Prometheus).
+"""
+import random
+import re
+import threading
+import time
+from collections import Counter, deque
+from contextlib import ExitStack, contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import (
+    DjangoTemplates, Template, reraise
+)
+from django.template.exceptions import TemplateDoesNotExist
+
+PARTS = ('db', 'template', 'thumbnail', 'cache')
+DUPLICATES_LIMIT = 5  # отпечатков повторов в замере
+
+_state = threading.local()
+_lock = threading.Lock()
+_samples = deque(maxlen=settings.PROFILING_BUFFER_SIZE)
+_totals = {}
+
+_IN_LIST = re.compile(r'\(\s*%s(?:\s*,\s*%s)+\s*\)')
+_NUMBER = re.compile(r'\b\d+\b')
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_SPACES = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """SQL без значений: одинаковый для запросов, различающихся только
+    параметрами."""
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _IN_LIST.sub('(...)', sql)
+    return _SPACES.sub(' ', sql).strip()
+
+
+class Profile:
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.parts = dict.fromkeys(PARTS, 0.0)
+        self.stack = []
+        self.queries = Counter()
+
+
+def current():
+    return getattr(_state, 'profile', None)
+
+
+@contextmanager
+def timed(part):
+    """Засчитывает время блока части part текущего замера."""
+    profile = current()
+    if profile is None:
+        yield
+        return
+    profile.stack.append(0.0)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        nested = profile.stack.pop()
+        profile.parts[part] += elapsed - nested
+        if profile.stack:
+            profile.stack[-1] += elapsed
+
+
+def profiled(part):
+    """Декоратор: всё время функции засчитывается части part."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed(part):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _execute(execute, sql, params, many, context):
+    current().queries[fingerprint(sql)] += 1
+    with timed('db'):
+        return execute(sql, params, many, context)
+
+
+@contextmanager
+def profiling():
+    """Профилирует блок в текущем потоке, отдаёт его Profile."""
+    profile = _state.profile = Profile()
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(_execute))
+            yield profile
+    finally:
+        _state.profile = None
+
+
+def sampled():
+    return random.random() < settings.PROFILING_SAMPLE_RATE
+
+
+def task(name):
+    """Декоратор фоновой задачи: профилирует долю запусков. Внутри
+    профилируемого запроса время засчитывается запросу."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if current() is not None or not sampled():
+                return func(*args, **kwargs)
+            status = 500
+            with profiling() as profile:
+                try:
+                    result = func(*args, **kwargs)
+                    status = 200
+                finally:
+                    record(f'task:{name}', 'TASK', status, profile)
+            return result
+        return wrapper
+    return decorator
+
+
+def record(view, method, status, profile):
+    total = time.perf_counter() - profile.started
+    other = total - sum(profile.parts.values())
+    duplicates = {
+        sql: count for sql, count in profile.queries.most_common(
+            DUPLICATES_LIMIT
+        ) if count > 1
+    }
+    sample = {
+        'view': view,
+        'method': method,
+        'status': status,
+        'time': time.time(),
+        'total': total,
+        'parts': dict(profile.parts, other=other),
+        'queries': sum(profile.queries.values()),
+        'duplicates': duplicates,
+    }
+    with _lock:
+        _samples.append(sample)
+        totals = _totals.setdefault(view, {
+            'requests': 0,
+            'seconds': dict.fromkeys(PARTS + ('other', 'total'), 0.0),
+            'max_seconds': 0.0,
+            'queries': 0,
+            'duplicate_queries': 0,
+            'duplicates': Counter(),
+        })
+        totals['requests'] += 1
+        for part, seconds in sample['parts'].items():
+            totals['seconds'][part] += seconds
+        totals['seconds']['total'] += total
+        totals['max_seconds'] = max(totals['max_seconds'], total)
+        totals['queries'] += sample['queries']
+        for sql, count in duplicates.items():
+            totals['duplicate_queries'] += count - 1
+            totals['duplicates'][sql] += count - 1
+    return sample
+
+
+def samples():
+    with _lock:
+        return list(_samples)
+
+
+def report():
+    """Суммы по view, начиная с самых затратных, и самые частые повторы
+    запросов в них."""
+    with _lock:
+        ranked = sorted(
+            _totals.items(), key=lambda item: -item[1]['seconds']['total']
+        )
+        return {
+            view: dict(
+                totals,
+                duplicates=dict(
+                    totals['duplicates'].most_common(DUPLICATES_LIMIT)
+                ),
+                seconds=dict(totals['seconds']),
+            )
+            for view, totals in ranked
+        }
+
+
+def reset():
+    with _lock:
+        _samples.clear()
+        _totals.clear()
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"')
+
+
+def prometheus():
+    """Суммы по view в текстовом формате Prometheus."""
+    metrics = (
+        ('requests', 'Sampled requests'),
+        ('seconds', 'Time spent in sampled requests by part'),
+        ('queries', 'Database queries in sampled requests'),
+        ('duplicate_queries', 'Repeated identical queries'),
+    )
+    totals = report()
+    lines = []
+    for name, help_text in metrics:
+        metric = f'yatube_view_{name}_total'
+        lines.append(f'# HELP {metric} {help_text}.')
+        lines.append(f'# TYPE {metric} counter')
+        for view, values in sorted(totals.items()):
+            label = f'view="{_escape(view)}"'
+            if name == 'seconds':
+                for part, seconds in values['seconds'].items():
+                    lines.append(
+                        f'{metric}{{{label},part="{part}"}} {seconds:.6f}'
+                    )
+            else:
+                lines.append(f'{metric}{{{label}}} {values[name]}')
+    return '\n'.join(lines) + '\n'
+
+
+class ProfilingMiddleware:
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not sampled() or request.path.startswith('/profiling/'):
+            return self.get_response(request)
+        with profiling() as profile:
+            response = self.get_response(request)
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else '<unresolved>'
+        record(view, request.method, response.status_code, profile)
+        return response
+
+
+class ProfiledTemplate(Template):
+
+    def render(self, context=None, request=None):
+        with timed('template'):
+            return super().render(context, request)
+
+
+class ProfiledDjangoTemplates(DjangoTemplates):
+    """Шаблоны Django, время отрисовки которых попадает в замер."""
+
+    def from_string(self, template_code):
+        return ProfiledTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return ProfiledTemplate(
+                self.engine.get_template(template_name), self
+            )
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
@@ -0,0 +1,125 @@
+"""Чтение лент с реплики базы.
+
+Реплика — база с алиасом REPLICA в settings.DATABASES. Читают с неё
+только view, обёрнутые в @read_from_replica (ленты постов), всё
+остальное и любые записи идут в основную базу.
+
+Реплика отстаёт от основной базы, поэтому пользователь, который только
+что что-то записал, ещё REPLICA_PIN_SECONDS секунд читает с основной:
+ReplicaPinMiddleware замечает запись во время запроса и ставит отметку
+в общий кэш, видимую всем воркерам. Так же и страница, области
+которой (core.cache) менялись недавно, собирается по основной базе:
+иначе кэш запомнил бы старое содержимое под новым поколением.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .cache import last_modified
+
+REPLICA = 'replica'
+PIN_KEY = 'replicas:pinned:{}'
+
+_state = threading.local()
+
+
+def available():
+    return REPLICA in settings.DATABASES
+
+
+def pin_key(user_id):
+    return PIN_KEY.format(user_id)
+
+
+def is_pinned(user):
+    return user.is_authenticated and bool(cache.get(pin_key(user.pk)))
+
+
+@contextmanager
+def replica():
+    """Чтения внутри блока идут на реплику, если она настроена."""
+    previous = getattr(_state, 'replica', False)
+    _state.replica = True
+    try:
+        yield
+    finally:
+        _state.replica = previous
+
+
+def read_from_replica(scopes=None):
+    """Читает данные view с реплики, если пользователь и области
+    страницы недавно не менялись.
+
+    scopes, как в core.cache, получает аргументы view из URL:
+    @read_from_replica(lambda slug: [f'group:{slug}'])
+    """
+    def fresh(*args, **kwargs):
+        if scopes is None:
+            return True
+        changed = last_modified(*scopes(*args, **kwargs)).timestamp()
+        return time.time() - changed >= settings.REPLICA_PIN_SECONDS
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if (
+                available()
+                and request.method in ('GET', 'HEAD')
+                and not is_pinned(request.user)
+                and fresh(*args, **kwargs)
+            ):
+                with replica():
+                    return view(request, *args, **kwargs)
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        if (
+            getattr(_state, 'replica', False)
+            and not getattr(_state, 'wrote', False)
+            and available()
+        ):
+            return REPLICA
+        return None
+
+    def db_for_write(self, model, **hints):
+        _state.wrote = True
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплика хранит те же строки, что и основная база.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != REPLICA
+
+
+class ReplicaPinMiddleware:
+    """Привязывает к основной базе пользователей, которые только что
+    писали."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        _state.wrote = False
+        response = self.get_response(request)
+        if (
+            getattr(_state, 'wrote', False)
+            and available()
+            and request.user.is_authenticated
+        ):
+            cache.set(
+                pin_key(request.user.pk), True,
+                settings.REPLICA_PIN_SECONDS,
+            )
+        _state.wrote = False
+        return response
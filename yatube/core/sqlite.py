@@ -0,0 +1,48 @@
+"""Настройка соединений SQLite (PRAGMA) при открытии.
+
+settings.SQLITE_PRAGMAS применяется к каждому новому соединению с
+SQLite. По умолчанию:
+
+- journal_mode=wal: читатели не ждут пишущего, а пишущий — читателей;
+- synchronous=normal: в режиме WAL fsync только на контрольных точках,
+  после сбоя питания можно потерять последние транзакции, но не базу;
+- busy_timeout: сколько миллисекунд ждать чужую блокировку вместо
+  немедленной ошибки «database is locked»;
+- mmap_size и cache_size: чтение страниц через отображение в память и
+  кэш страниц побольше (отрицательный размер — в килобайтах).
+
+Пустой словарь оставляет настройки SQLite по умолчанию.
+"""
+from django.conf import settings
+
+
+def pragma_statements(pragmas):
+    return [f'PRAGMA {name} = {value}' for name, value in pragmas.items()]
+
+
+def apply_pragmas(connection, pragmas):
+    """Применяет PRAGMA к соединению sqlite3 или курсору Django."""
+    cursor = connection.cursor()
+    try:
+        for statement in pragma_statements(pragmas):
+            cursor.execute(statement)
+    finally:
+        cursor.close()
+
+
+def in_memory_db(connection):
+    """SQLite в памяти (тестовая база): потоки делят её через shared
+    cache, где чужая блокировка таблицы сразу даёт ошибку, так что фоновые
+    задачи должны идти в потоке запроса."""
+    return connection.vendor == 'sqlite' and connection.is_in_memory_db()
+
+
+def configure_connection(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = dict(settings.SQLITE_PRAGMAS)
+    if connection.is_in_memory_db():
+        # WAL и отображение файла в память базе в памяти не нужны.
+        pragmas.pop('journal_mode', None)
+        pragmas.pop('mmap_size', None)
+    apply_pragmas(connection.connection, pragmas)
@@ -0,0 +1,12 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from core import holes
+
+register = template.Library()
+
+
+@register.simple_tag
+def hole(name, **params):
+    """Метка персонального фрагмента, см. core.holes."""
+    return mark_safe(holes.marker(name, **params))
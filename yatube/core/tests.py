@@ -0,0 +1,380 @@
+import shutil
+import tempfile
+import time
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache, caches
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, TestCase, override_settings
+
+from . import profiling, replicas
+from .cache import (
+    MODIFIED_PREFIX, bump, cache_page_by_generations, generations
+)
+from .cache_backends import LocalStore, TieredCache
+from .sqlite import configure_connection
+
+
+class TieredCacheTests(TestCase):
+    def setUp(self):
+        caches['shared'].clear()
+        # Два воркера: общий L2 и у каждого свой L1.
+        self.first = self.worker()
+        self.second = self.worker()
+
+    def worker(self, **options):
+        # Синхронизация на каждом чтении: проверяем сам журнал.
+        options.setdefault('SYNC_INTERVAL', 0)
+        worker = TieredCache('shared', {'OPTIONS': options})
+        worker.local = LocalStore(100)
+        return worker
+
+    def test_value_is_shared_between_workers(self):
+        self.first.set('key', 'value')
+        self.assertEqual(self.second.get('key'), 'value')
+        self.assertEqual(caches['shared'].get('key'), 'value')
+
+    def test_repeated_read_is_served_from_l1(self):
+        self.first.set('key', 'value')
+        self.second.get('key')
+        caches['shared'].set('key', 'changed behind the cache')
+        self.assertEqual(self.second.get('key'), 'value')
+
+    def test_write_in_one_worker_invalidates_other_l1(self):
+        self.first.set('key', 'old')
+        self.assertEqual(self.second.get('key'), 'old')
+        self.first.set('key', 'new')
+        self.assertEqual(self.second.get('key'), 'new')
+        self.first.delete('key')
+        self.assertIsNone(self.second.get('key'))
+
+    def test_incr_is_atomic_in_l2_and_visible_everywhere(self):
+        self.first.set('counter', 1)
+        self.second.get('counter')
+        self.assertEqual(self.first.incr('counter'), 2)
+        self.assertEqual(self.second.incr('counter'), 3)
+        self.assertEqual(self.first.get('counter'), 3)
+        self.assertEqual(self.second.get('counter'), 3)
+
+    def test_versions_are_separate_keys(self):
+        self.first.set('key', 'v1', version=1)
+        self.first.set('key', 'v2', version=2)
+        self.assertEqual(self.second.get('key', version=1), 'v1')
+        self.assertEqual(self.second.get('key', version=2), 'v2')
+        self.first.incr_version('key', version=2)
+        self.assertIsNone(self.second.get('key', version=2))
+        self.assertEqual(self.second.get('key', version=3), 'v2')
+
+    def test_get_many_and_set_many(self):
+        self.first.set_many({'a': 1, 'b': 2})
+        self.assertEqual(self.second.get_many(['a', 'b', 'c']),
+                         {'a': 1, 'b': 2})
+        self.first.set_many({'a': 10})
+        self.assertEqual(self.second.get_many(['a', 'b']), {'a': 10, 'b': 2})
+
+    def test_clear_drops_all_l1(self):
+        self.first.set('key', 'value')
+        self.second.get('key')
+        self.first.clear()
+        self.assertIsNone(self.second.get('key'))
+
+    def test_lost_log_clears_l1(self):
+        self.first.set('key', 'value')
+        self.second.get('key')
+        caches['shared'].clear()
+        caches['shared'].set('key', 'restored')
+        self.first.set('other', 1)
+        self.assertEqual(self.second.get('key'), 'restored')
+
+    def test_l1_is_bounded(self):
+        worker = self.worker()
+        worker.local = LocalStore(2)
+        for key in ('a', 'b', 'c'):
+            worker.set(key, key)
+        self.assertEqual(len(worker.local.entries), 2)
+        self.assertEqual(worker.get('a'), 'a')
+
+
+class TieredCacheFileStoreTests(TestCase):
+    """Два воркера с настройками по умолчанию над файловым L2 — как два
+    процесса, у которых общий только L2."""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.store = FileBasedCache(
+            directory, {'KEY_PREFIX': 'site', 'VERSION': 2}
+        )
+        patcher = patch.object(TieredCache, 'shared', self.store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.first = self.worker()
+        self.second = self.worker()
+
+    def worker(self):
+        worker = TieredCache('shared', {})
+        worker.local = LocalStore(100)
+        return worker
+
+    def test_write_reaches_other_worker_after_sync_interval(self):
+        self.first.set('key', 'old')
+        self.assertEqual(self.second.get('key'), 'old')
+
+        self.first.set('key', 'new')
+
+        self.assertEqual(self.first.get('key'), 'new')
+        self.assertEqual(self.second.get('key'), 'old')
+        self.second.local.synced_at -= self.second.sync_interval
+        self.assertEqual(self.second.get('key'), 'new')
+
+    def test_keys_are_the_same_as_in_l2(self):
+        self.assertEqual(self.first.make_key('key'), 'site:2:key')
+        self.first.set('key', 'value')
+        self.assertEqual(self.store.get('key'), 'value')
+        self.store.set('direct', 'value')
+        self.assertEqual(self.second.get('direct'), 'value')
+
+        self.first.incr_version('key')
+
+        self.assertEqual(self.store.get('key', version=3), 'value')
+        self.assertIsNone(self.store.get('key'))
+
+
+class PageCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        model = get_user_model()
+        self.first = model.objects.create_user('first')
+        self.second = model.objects.create_user('second')
+
+    def get(self, view, user):
+        request = self.factory.get('/page/')
+        request.user = user
+        return view(request).content
+
+    def page(self, **options):
+        def view(request):
+            return HttpResponse(str(request.user))
+        return cache_page_by_generations(60, lambda: ['page'], **options)(
+            view
+        )
+
+    def test_users_do_not_see_each_others_pages(self):
+        view = self.page()
+
+        self.assertEqual(self.get(view, self.first), b'first')
+        self.assertEqual(self.get(view, self.second), b'second')
+        self.assertEqual(self.get(view, AnonymousUser()), b'AnonymousUser')
+        self.assertEqual(self.get(view, self.first), b'first')
+
+    def test_shared_page_is_rendered_without_user(self):
+        view = self.page(shared=True)
+
+        self.assertEqual(self.get(view, self.first), b'AnonymousUser')
+        self.assertEqual(self.get(view, self.second), b'AnonymousUser')
+
+    def test_bump_in_transaction_repeats_after_commit(self):
+        view = self.page()
+
+        with patch('core.cache.transaction.on_commit') as on_commit:
+            bump('page')
+        self.get(view, self.first)
+        self.first.username = 'renamed'
+        generation = generations('page')
+        on_commit.call_args[0][0]()
+
+        self.assertGreater(generations('page'), generation)
+        self.assertEqual(self.get(view, self.first), b'renamed')
+
+
+@patch.object(replicas, 'available', return_value=True)
+class ReplicaRouterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.router = replicas.ReplicaRouter()
+        self.factory = RequestFactory()
+        self.user = get_user_model().objects.create_user('reader')
+        replicas._state.wrote = False
+
+    def request(self, method='get', user=None):
+        request = getattr(self.factory, method)('/')
+        request.user = user or AnonymousUser()
+        return request
+
+    def view(self, request):
+        return HttpResponse(self.router.db_for_read(None) or 'default')
+
+    def listing(self, scope='all'):
+        cache.set(MODIFIED_PREFIX + scope, time.time() - 60, None)
+        return replicas.read_from_replica(lambda: [scope])(self.view)
+
+    def test_reads_go_to_replica_only_inside_block(self, available):
+        self.assertIsNone(self.router.db_for_read(None))
+        with replicas.replica():
+            self.assertEqual(self.router.db_for_read(None), 'replica')
+        self.assertIsNone(self.router.db_for_read(None))
+
+    def test_reads_after_write_stay_on_primary(self, available):
+        with replicas.replica():
+            self.assertIsNone(self.router.db_for_write(None))
+            self.assertIsNone(self.router.db_for_read(None))
+
+    def test_replica_is_never_migrated(self, available):
+        self.assertFalse(self.router.allow_migrate('replica', 'posts'))
+        self.assertTrue(self.router.allow_migrate('default', 'posts'))
+
+    def test_listing_reads_from_replica(self, available):
+        response = self.listing()(self.request())
+        self.assertEqual(response.content, b'replica')
+
+    def test_post_requests_read_from_primary(self, available):
+        response = self.listing()(self.request('post'))
+        self.assertEqual(response.content, b'default')
+
+    def test_recently_changed_scope_reads_from_primary(self, available):
+        view = self.listing()
+        cache.set(MODIFIED_PREFIX + 'all', time.time(), None)
+        self.assertEqual(view(self.request()).content, b'default')
+
+    def test_writer_is_pinned_to_primary(self, available):
+        def write(request):
+            self.router.db_for_write(None)
+            return HttpResponse()
+
+        replicas.ReplicaPinMiddleware(write)(self.request('post', self.user))
+
+        response = self.listing()(self.request(user=self.user))
+        self.assertEqual(response.content, b'default')
+        response = self.listing()(self.request())
+        self.assertEqual(response.content, b'replica')
+
+
+class SqlitePragmaTests(TestCase):
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    @override_settings(SQLITE_PRAGMAS={
+        'busy_timeout': 1234, 'journal_mode': 'wal',
+    })
+    def test_pragmas_are_applied_to_new_connections(self):
+        configure_connection(None, connection)
+        self.assertEqual(self.pragma('busy_timeout'), 1234)
+        # Базе в памяти WAL не включается.
+        self.assertEqual(self.pragma('journal_mode'), 'memory')
+
+    def test_benchmark_reports_both_modes(self):
+        out = StringIO()
+        call_command(
+            'benchmark_sqlite', seconds=0.1, readers=1, writers=1, rows=10,
+            stdout=out,
+        )
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[2].startswith('SQLITE_PRAGMAS'))
+
+
+@override_settings(PROFILING_SAMPLE_RATE=1, PROFILING_TOKEN='secret')
+class ProfilingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        profiling.reset()
+        self.user = get_user_model().objects.create_user('admin')
+
+    def test_fingerprint_ignores_values(self):
+        self.assertEqual(
+            profiling.fingerprint("SELECT 1 FROM t WHERE a = 'x'  AND b = 2"),
+            'SELECT ? FROM t WHERE a = ? AND b = ?',
+        )
+        self.assertEqual(
+            profiling.fingerprint('SELECT * FROM t WHERE id IN (%s, %s)'),
+            'SELECT * FROM t WHERE id IN (...)',
+        )
+
+    def test_view_time_is_split_by_part(self):
+        Client().get('/')
+
+        totals = profiling.report()['posts:index']
+        self.assertEqual(totals['requests'], 1)
+        self.assertGreater(totals['queries'], 0)
+        for part in ('db', 'template', 'cache'):
+            self.assertGreater(totals['seconds'][part], 0, part)
+        self.assertAlmostEqual(
+            sum(
+                seconds for part, seconds in totals['seconds'].items()
+                if part != 'total'
+            ),
+            totals['seconds']['total'],
+        )
+
+    def test_repeated_queries_are_reported(self):
+        def view(request):
+            for pk in range(3):
+                get_user_model().objects.filter(pk=pk).exists()
+            return HttpResponse()
+
+        profiling.ProfilingMiddleware(view)(RequestFactory().get('/'))
+
+        sample, = profiling.samples()
+        self.assertEqual(sample['queries'], 3)
+        self.assertEqual(list(sample['duplicates'].values()), [3])
+        totals = profiling.report()['<unresolved>']
+        self.assertEqual(totals['duplicate_queries'], 2)
+
+    def test_background_task_is_profiled_on_its_own(self):
+        @profiling.task('demo')
+        def work():
+            return get_user_model().objects.count()
+
+        self.assertEqual(work(), 1)
+
+        totals = profiling.report()['task:demo']
+        self.assertEqual(totals['requests'], 1)
+        self.assertEqual(totals['queries'], 1)
+
+    def test_task_run_inside_request_counts_to_request(self):
+        @profiling.task('demo')
+        def work():
+            get_user_model().objects.exists()
+
+        def view(request):
+            work()
+            return HttpResponse()
+
+        profiling.ProfilingMiddleware(view)(RequestFactory().get('/'))
+
+        report = profiling.report()
+        self.assertNotIn('task:demo', report)
+        self.assertEqual(report['<unresolved>']['queries'], 1)
+
+    def test_reports_are_for_staff_only(self):
+        Client().get('/')
+        client = Client()
+        client.force_login(self.user)
+
+        response = client.get('/profiling/metrics')
+        self.assertEqual(response.status_code, 302)
+
+        self.user.is_staff = True
+        self.user.save()
+        response = client.get('/profiling/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(
+            'yatube_view_requests_total{view="posts:index"} 1',
+            response.content.decode(),
+        )
+        self.assertIn('posts:index', client.get('/profiling/').json()['views'])
+
+    def test_metrics_accept_bearer_token(self):
+        response = Client().get(
+            '/profiling/metrics', HTTP_AUTHORIZATION='Bearer secret'
+        )
+        self.assertEqual(response.status_code, 200)
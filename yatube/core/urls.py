@@ -0,0 +1,10 @@
+from django.urls import path
+
+from . import views
+
+app_name = 'core'
+
+urlpatterns = [
+    path('', views.profiling_report, name='profiling'),
+    path('metrics', views.profiling_metrics, name='profiling_metrics'),
+]
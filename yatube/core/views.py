@@ -1,4 +1,12 @@
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import HttpResponse, JsonResponse
 from django.shortcuts import render
+from django.utils.crypto import constant_time_compare
+
+from . import profiling
 
 
 def page_not_found(request, exception):
@@ -15,3 +23,34 @@ def server_error(request):
 
 def permission_denied(request, exception):
     return render(request, 'core/403.html', status=403)
+
+
+def staff_or_token(view):
+    """Пускает персонал, а сборщик метрик — по PROFILING_TOKEN в
+    заголовке Authorization: Bearer."""
+    staff_view = staff_member_required(view)
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        token = settings.PROFILING_TOKEN
+        header = request.META.get('HTTP_AUTHORIZATION', '')
+        if token and constant_time_compare(header, f'Bearer {token}'):
+            return view(request, *args, **kwargs)
+        return staff_view(request, *args, **kwargs)
+    return wrapper
+
+
+@staff_or_token
+def profiling_report(request):
+    return JsonResponse({
+        'sample_rate': settings.PROFILING_SAMPLE_RATE,
+        'views': profiling.report(),
+        'samples': profiling.samples(),
+    }, json_dumps_params={'ensure_ascii': False})
+
+
+@staff_or_token
+def profiling_metrics(request):
+    return HttpResponse(
+        profiling.prometheus(), content_type='text/plain; version=0.0.4'
+    )
@@ -0,0 +1,202 @@
+"""JSON API лент и постов.
+
+Ответы компактные и снабжены сильным ETag. ETag — хэш id и версий
+постов ответа и остальных его полей (курсоры, счётчики, группа), так что
+304 Not Modified приходит ровно тогда, когда данные не изменились, а не
+после любой записи на сайте. На 304 посты страницы всё равно читаются
+из базы, но не сериализуются и не передаются.
+"""
+import hashlib
+import json
+from functools import wraps
+
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.utils.cache import (
+    get_conditional_response, patch_cache_control, patch_vary_headers
+)
+from django.utils.http import quote_etag
+from django.views.decorators.http import require_GET, require_POST
+
+from core.replicas import read_from_replica
+
+from . import counters, follows, timeline
+from .models import Group, Post, User
+from .views import group_scopes, index_scopes, paginator, profile_scopes
+
+API_VERSION = '1'  # меняется вместе с форматом ответов
+
+
+def json_response(data):
+    return JsonResponse(data, json_dumps_params={
+        'ensure_ascii': False, 'separators': (',', ':'),
+    })
+
+
+def etag(request, posts, data):
+    parts = [
+        API_VERSION,
+        request.get_full_path(),
+        [(post.pk, post.version) for post in posts],
+        data,
+    ]
+    return hashlib.md5(
+        json.dumps(parts, sort_keys=True, default=str).encode()
+    ).hexdigest()
+
+
+def api_view(many=True):
+    """Условный GET для API.
+
+    view возвращает посты ответа и остальные его поля. Посты
+    сериализуются, только если ETag клиента не совпал: лента — в
+    results, пост (many=False) — в корень ответа.
+    """
+    def decorator(view):
+        @require_GET
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            posts, data = view(request, *args, **kwargs)
+            tag = quote_etag(etag(request, posts, data))
+            response = get_conditional_response(request, etag=tag)
+            if response is None:
+                if many:
+                    data = {
+                        **data,
+                        'results': [serialize_post(post) for post in posts],
+                    }
+                else:
+                    data = {**serialize_post(posts[0]), **data}
+                response = json_response(data)
+            response['ETag'] = tag
+            # Клиент хранит ответ, но каждый раз сверяет ETag.
+            patch_cache_control(response, no_cache=True)
+            patch_vary_headers(response, ('Cookie',))
+            return response
+        return wrapper
+    return decorator
+
+
+def error_response(message, status):
+    response = json_response({'detail': message})
+    response.status_code = status
+    return response
+
+
+def login_required_json(view):
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return error_response('Нужна авторизация.', 401)
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def serialize_user(user):
+    return {'username': user.username, 'name': user.get_full_name()}
+
+
+def serialize_post(post):
+    return {
+        'id': post.pk,
+        'text': post.text,
+        'pub_date': post.pub_date.isoformat(),
+        'author': post.author.username,
+        'group': post.group.slug if post.group_id else None,
+        'image': post.thumbnail_urls.get('card') or (
+            post.image.url if post.image else None
+        ),
+        'version': post.version,
+    }
+
+
+def feed(page, **extra):
+    return list(page), {
+        **extra,
+        'next': page.next_cursor,
+        'previous': page.previous_cursor,
+    }
+
+
+@api_view()
+@read_from_replica(index_scopes)
+def index(request):
+    return feed(paginator(request, Post.objects.for_listing()))
+
+
+@api_view()
+@read_from_replica(group_scopes)
+def group_posts(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    page = paginator(request, Post.objects.for_listing().filter(group=group))
+    return feed(page, group={
+        'slug': group.slug,
+        'title': group.title,
+        'description': group.description,
+    })
+
+
+@api_view()
+@read_from_replica(profile_scopes)
+def profile(request, username):
+    author = get_object_or_404(User, username=username)
+    stats = counters.stats(author)
+    page = paginator(request, Post.objects.for_listing().filter(author=author))
+    return feed(page, author={
+        **serialize_user(author),
+        'posts_count': stats.posts_count,
+        'followers_count': stats.followers_count,
+    })
+
+
+@login_required_json
+@api_view()
+@read_from_replica(index_scopes)
+def follow_index(request):
+    page = paginator(
+        request, timeline.sources(request.user), ordering=timeline.ORDERING
+    )
+    page.object_list = timeline.posts(page)
+    return feed(page)
+
+
+@api_view(many=False)
+def post_detail(request, post_id):
+    post = get_object_or_404(
+        Post.objects.select_related('author', 'group'), pk=post_id
+    )
+    return [post], {
+        'author': serialize_user(post.author),
+        'comments_count': post.comments_count,
+    }
+
+
+BULK_ACTIONS = {
+    'follow': follows.follow_many,
+    'unfollow': follows.unfollow_many,
+}
+
+
+@login_required_json
+@require_POST
+def follow_bulk(request):
+    """Подписка или отписка списком.
+
+    Тело: {"action": "follow" | "unfollow", "usernames": [...]}.
+    Ответ: {"results": {имя: результат}}, см. posts.follows.
+    """
+    try:
+        data = json.loads(request.body)
+        usernames = data['usernames']
+        action = BULK_ACTIONS[data.get('action', 'follow')]
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return error_response('Ожидается action и список usernames.', 400)
+    if not isinstance(usernames, list) or not all(
+        isinstance(username, str) for username in usernames
+    ):
+        return error_response('usernames — список имён.', 400)
+    if len(usernames) > follows.MAX_USERNAMES:
+        return error_response(
+            f'Не больше {follows.MAX_USERNAMES} имён за раз.', 400
+        )
+    return json_response({'results': action(request.user, usernames)})
@@ -0,0 +1,235 @@
+"""Нагрузочные замеры приложения posts на синтетических данных.
+
+seed() наполняет базу объёмами, близкими к боевым: пользователи,
+группы, посты, комментарии и подписки с перекосом (у немногих авторов
+почти все подписчики, как в жизни). Данные пишутся пачками без
+сигналов (bulk_create, а посты и комментарии с датами — bulk.insert),
+каждая пачка своей транзакцией; производные таблицы (счётчики, ленты,
+поиск) собираются после загрузки целиком.
+
+run() гоняет страницы и формы через тестовый клиент со всеми
+middleware и считает перцентили задержки и число запросов к базе, а
+compare() сверяет прогон с сохранённым базовым.
+
+Замеры пишут в базу и сбрасывают кэш: запускайте их на отдельной базе
+(DB_NAME=bench.sqlite3, см. settings.DATABASES).
+"""
+import itertools
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from faker import Faker
+
+from .bulk import batches, insert, rebuild_derived
+from .models import Comment, Follow, Group, Post, User
+
+USERNAME = 'bench{}'
+PERCENTILES = (50, 95, 99)
+# Прогон хуже базового больше чем на столько — регрессия.
+DEFAULT_TOLERANCE = 0.2
+
+
+def zipf_weights(count, exponent):
+    """Накопленные веса распределения Ципфа для random.choices."""
+    return list(itertools.accumulate(
+        1 / rank ** exponent for rank in range(1, count + 1)
+    ))
+
+
+def seed(users, posts, comments, groups, follows_per_user, days=365,
+         random_seed=0, log=print):
+    """Наполняет базу синтетическими данными и пересобирает производные
+    таблицы. Пользователи — bench0…benchN с паролем bench."""
+    rng = random.Random(random_seed)
+    fake = Faker('ru_RU')
+    fake.seed_instance(random_seed)
+    phrases = [fake.paragraph(nb_sentences=4) for _ in range(500)]
+    password = make_password('bench')
+    now = timezone.now()
+
+    def moment():
+        return now - timedelta(seconds=rng.randrange(days * 24 * 3600))
+
+    log(f'Пользователи: {users}')
+    first_pk = (User.objects.order_by('-pk').values_list(
+        'pk', flat=True
+    ).first() or 0) + 1
+    for batch in batches(
+        User(username=USERNAME.format(number), password=password)
+        for number in range(users)
+    ):
+        User.objects.bulk_create(batch)
+    user_ids = list(User.objects.filter(
+        pk__gte=first_pk, username__startswith='bench'
+    ).values_list('pk', flat=True))
+
+    log(f'Группы: {groups}')
+    Group.objects.bulk_create(
+        Group(
+            title=f'Группа {number}', slug=f'bench-{number}',
+            description=rng.choice(phrases),
+        )
+        for number in range(groups)
+    )
+    group_ids = list(Group.objects.filter(
+        slug__startswith='bench-'
+    ).values_list('pk', flat=True)) + [None]
+
+    log(f'Посты: {posts}')
+    for batch in batches(
+        Post(
+            text=rng.choice(phrases),
+            author_id=rng.choice(user_ids),
+            group_id=rng.choice(group_ids),
+            pub_date=moment(),
+        )
+        for _ in range(posts)
+    ):
+        insert(batch)
+    post_ids = list(Post.objects.order_by('-pub_date').values_list(
+        'pk', flat=True
+    )[:posts])
+
+    log(f'Комментарии: {comments}')
+    # Свежие посты обсуждают чаще старых.
+    hot_posts = zipf_weights(len(post_ids), 0.8)
+    for batch in batches(
+        Comment(
+            post_id=post_id,
+            author_id=rng.choice(user_ids),
+            text=rng.choice(phrases)[:200],
+            created=moment(),
+        )
+        for post_id in rng.choices(
+            post_ids, cum_weights=hot_posts, k=comments
+        )
+    ):
+        insert(batch)
+
+    log(f'Подписки: около {follows_per_user} на пользователя')
+    popular = zipf_weights(len(user_ids), 1.1)
+    authors = user_ids[:]
+    rng.shuffle(authors)
+
+    def follows():
+        for user_id in user_ids:
+            count = rng.randint(0, 2 * follows_per_user)
+            chosen = set(rng.choices(authors, cum_weights=popular, k=count))
+            chosen.discard(user_id)
+            for author_id in chosen:
+                yield Follow(user_id=user_id, author_id=author_id)
+
+    for batch in batches(follows()):
+        Follow.objects.bulk_create(batch, ignore_conflicts=True)
+
+    log('Счётчики, ленты и поиск')
+    rebuild_derived()
+
+
+def percentile(values, percent):
+    """Перцентиль по ближайшему рангу."""
+    ordered = sorted(values)
+    rank = max(0, -(-len(ordered) * percent // 100) - 1)
+    return ordered[rank]
+
+
+def scenarios():
+    """Замеряемые запросы: (имя, метод, адрес, данные, от читателя ли).
+
+    Берутся самые нагруженные объекты: крупнейшая группа, самый
+    плодовитый автор, самый обсуждаемый пост, а читатель — пользователь
+    с наибольшим числом подписок.
+    """
+    group = Group.objects.annotate(size=Count('posts')).order_by(
+        '-size'
+    ).first()
+    author = User.objects.filter(stats__isnull=False).order_by(
+        '-stats__posts_count'
+    ).first()
+    post = Post.objects.order_by('-comments_count', '-pk').first()
+    reader = User.objects.annotate(follows=Count('follower')).order_by(
+        '-follows'
+    ).first()
+    if post is None or author is None:
+        return None, []
+    result = [
+        ('index', 'get', reverse('posts:index'), None, False),
+        ('profile', 'get', reverse('posts:profile', args=[author]),
+         None, False),
+        ('post_detail', 'get',
+         reverse('posts:post_detail', args=[post.pk]), None, False),
+        ('follow_index', 'get', reverse('posts:follow_index'), None, True),
+        ('post_create', 'post', reverse('posts:post_create'),
+         {'text': 'Замер'}, True),
+        ('add_comment', 'post',
+         reverse('posts:add_comment', args=[post.pk]),
+         {'text': 'Замер'}, True),
+    ]
+    if group is not None:
+        result.insert(1, (
+            'group_posts', 'get',
+            reverse('posts:group_list', args=[group.slug]), None, False,
+        ))
+    return reader, result
+
+
+def run(iterations=50, warmup=5, cold=False):
+    """Замеряет сценарии; cold — без кэша страниц (очистка перед
+    каждым запросом)."""
+    reader, requests = scenarios()
+    results = {}
+    for name, method, url, data, login in requests:
+        client = Client()
+        if login:
+            client.force_login(reader)
+        send = getattr(client, method)
+        latencies = []
+        queries = []
+        for number in range(warmup + iterations):
+            if cold:
+                cache.clear()
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = send(url, data)
+                elapsed = time.perf_counter() - started
+            if response.status_code >= 400:
+                raise RuntimeError(f'{name}: ответ {response.status_code}')
+            if number >= warmup:
+                latencies.append(elapsed * 1000)
+                queries.append(len(captured.captured_queries))
+        results[name] = dict(
+            {f'p{percent}': percentile(latencies, percent)
+             for percent in PERCENTILES},
+            queries=max(queries),
+        )
+    return results
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Регрессии относительно базового прогона: p95 медленнее больше
+    чем на tolerance или больше запросов к базе."""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        if current['p95'] > previous['p95'] * (1 + tolerance):
+            regressions.append(
+                f'{name}: p95 {current["p95"]:.1f} мс, '
+                f'было {previous["p95"]:.1f} мс'
+            )
+        if current['queries'] > previous['queries']:
+            regressions.append(
+                f'{name}: запросов {current["queries"]}, '
+                f'было {previous["queries"]}'
+            )
+    return regressions
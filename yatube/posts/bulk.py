@@ -0,0 +1,69 @@
+"""Общее для массовой загрузки данных (seed_benchmark, import_yatube).
+
+bulk_create не шлёт сигналов, поэтому производные таблицы (счётчики,
+ленты, поисковый индекс) и кэш страниц после загрузки собираются
+заново целиком — rebuild_derived().
+"""
+import itertools
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+
+from . import search, timeline
+
+BATCH_SIZE = 5000
+
+
+def insert(objects, ignore_conflicts=False):
+    """Вставляет объекты одной модели как есть.
+
+    В отличие от bulk_create значения полей не проходят pre_save, так что
+    auto_now_add не заменяет заданные даты. Сигналов нет, id объектам без
+    id не присваиваются.
+    """
+    groups = {}
+    for obj in objects:
+        groups.setdefault(obj.pk is None, []).append(obj)
+    ops = connection.ops
+    with connection.cursor() as cursor:
+        for without_pk, group in groups.items():
+            opts = group[0]._meta
+            fields = [
+                field for field in opts.concrete_fields
+                if not (without_pk and field.primary_key)
+            ]
+            cursor.executemany(
+                f'{ops.insert_statement(ignore_conflicts=ignore_conflicts)} '
+                f'{ops.quote_name(opts.db_table)} ('
+                f'{", ".join(ops.quote_name(f.column) for f in fields)}'
+                f') VALUES ({", ".join(["%s"] * len(fields))}) '
+                f'{ops.ignore_conflicts_suffix_sql(ignore_conflicts)}',
+                [
+                    [
+                        field.get_db_prep_save(
+                            getattr(obj, field.attname), connection
+                        )
+                        for field in fields
+                    ]
+                    for obj in group
+                ],
+            )
+
+
+def batches(objects, size=BATCH_SIZE):
+    iterator = iter(objects)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def rebuild_derived():
+    """Пересобирает счётчики, ленты и поиск и сбрасывает кэш страниц."""
+    call_command('reconcile_counters', stdout=StringIO())
+    timeline.rebuild_all()
+    search.reindex()
+    cache.clear()
@@ -0,0 +1,72 @@
+"""Денормализованные счётчики постов, подписчиков и комментариев.
+
+Счётчики меняются атомарным UPDATE ... SET n = n + 1 в тех же
+местах, где пишутся сами записи. Если что-то разошлось,
+reconcile_counters пересчитывает значения по таблицам.
+"""
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+from .models import Follow, Post, UserStats
+
+
+def _delta(field, delta):
+    return Greatest(F(field) + delta, 0)
+
+
+def recount(user_id):
+    """Считает счётчики пользователя заново и сохраняет их."""
+    stats, _ = UserStats.objects.update_or_create(
+        user_id=user_id,
+        defaults={
+            'posts_count': Post.objects.filter(author_id=user_id).count(),
+            'followers_count': Follow.objects.filter(
+                author_id=user_id
+            ).count(),
+        },
+    )
+    return stats
+
+
+def change(user_id, **deltas):
+    """Сдвигает счётчики пользователя: change(pk, posts_count=1).
+
+    Строки счётчиков создаются лениво: при первом увеличении
+    значения берутся пересчётом. Уменьшать несуществующую строку
+    не нужно — её соберёт следующий пересчёт.
+    """
+    updated = UserStats.objects.filter(user_id=user_id).update(**{
+        field: _delta(field, delta) for field, delta in deltas.items()
+    })
+    if not updated and any(delta > 0 for delta in deltas.values()):
+        recount(user_id)
+
+
+def change_many(user_ids, **deltas):
+    """Как change, но для многих пользователей одним UPDATE."""
+    user_ids = set(user_ids)
+    UserStats.objects.filter(user_id__in=user_ids).update(**{
+        field: _delta(field, delta) for field, delta in deltas.items()
+    })
+    if any(delta > 0 for delta in deltas.values()):
+        missing = user_ids - set(
+            UserStats.objects.filter(user_id__in=user_ids).values_list(
+                'user_id', flat=True
+            )
+        )
+        for user_id in missing:
+            recount(user_id)
+
+
+def change_comments(post_id, delta):
+    Post.objects.filter(pk=post_id).update(
+        comments_count=_delta('comments_count', delta)
+    )
+
+
+def stats(user):
+    """Счётчики пользователя без агрегатных запросов."""
+    try:
+        return user.stats
+    except UserStats.DoesNotExist:
+        return recount(user.pk)
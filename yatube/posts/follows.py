@@ -0,0 +1,119 @@
+"""Подписка и отписка сразу на многих авторов.
+
+Импорт списка подписок из другой сети — это тысячи имён. Здесь они
+разрешаются одним запросом, подписки пишутся одним bulk_create, а
+счётчики, ленты и кэш страниц обновляются пачкой, а не сигналами на
+каждую строку.
+"""
+from django.db import connection, transaction
+
+from core.cache import bump
+
+from . import counters, scopes, timeline
+from .bulk import batches
+from .models import Follow, User
+
+FOLLOWED = 'followed'
+UNFOLLOWED = 'unfollowed'
+ALREADY_FOLLOWING = 'already_following'
+NOT_FOLLOWING = 'not_following'
+NOT_FOUND = 'not_found'
+SELF = 'self'
+
+MAX_USERNAMES = 5000
+DELETE_BATCH = 500  # id в одном DELETE … IN (...)
+
+
+def _resolve(usernames):
+    return dict(
+        User.objects.filter(username__in=set(usernames)).values_list(
+            'username', 'pk'
+        )
+    )
+
+
+def _changed(user, authors):
+    bump(
+        scopes.follows(user.pk),
+        *(scopes.author(username) for username in authors),
+    )
+
+
+def _delete_follows(pks):
+    with connection.cursor() as cursor:
+        for batch in batches(pks, DELETE_BATCH):
+            cursor.execute(
+                f'DELETE FROM {Follow._meta.db_table} WHERE id IN '
+                f'({", ".join(["%s"] * len(batch))})',
+                batch,
+            )
+
+
+def follow_many(user, usernames):
+    """Подписывает user на авторов; возвращает {имя: результат}."""
+    authors = _resolve(usernames)
+    existing = set(
+        Follow.objects.filter(
+            user=user, author_id__in=authors.values()
+        ).values_list('author_id', flat=True)
+    )
+    results = {}
+    new = {}
+    for username in usernames:
+        author_id = authors.get(username)
+        if author_id is None:
+            results[username] = NOT_FOUND
+        elif author_id == user.pk:
+            results[username] = SELF
+        elif author_id in existing:
+            results[username] = ALREADY_FOLLOWING
+        else:
+            results[username] = FOLLOWED
+            new[username] = author_id
+    if new:
+        with transaction.atomic():
+            # Гонку с параллельной подпиской решает unique_follow;
+            # разошедшиеся при этом счётчики поправит reconcile_counters.
+            Follow.objects.bulk_create(
+                (
+                    Follow(user=user, author_id=author_id)
+                    for author_id in new.values()
+                ),
+                ignore_conflicts=True,
+            )
+            counters.change_many(new.values(), followers_count=1)
+            timeline.followers_changed_many(new.values())
+            timeline.subscribe_many(user.pk, new.values())
+        _changed(user, new)
+    return results
+
+
+def unfollow_many(user, usernames):
+    """Отписывает user от авторов; возвращает {имя: результат}."""
+    authors = _resolve(usernames)
+    follows = dict(
+        Follow.objects.filter(
+            user=user, author_id__in=authors.values()
+        ).values_list('author_id', 'pk')
+    )
+    results = {}
+    removed = {}
+    for username in usernames:
+        author_id = authors.get(username)
+        if author_id is None:
+            results[username] = NOT_FOUND
+        elif author_id not in follows:
+            results[username] = NOT_FOLLOWING
+        else:
+            results[username] = UNFOLLOWED
+            removed[username] = author_id
+    if removed:
+        with transaction.atomic():
+            # Обычный delete() отправил бы post_delete на каждую
+            # подписку; всё, что делают эти сигналы, сделано ниже пачкой.
+            _delete_follows([follows[pk] for pk in removed.values()])
+            counters.change_many(removed.values(), followers_count=-1)
+            timeline.unsubscribe_many(user.pk, removed.values())
+            timeline.followers_changed_many(removed.values())
+        _changed(user, removed)
+    return results
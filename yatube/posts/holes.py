@@ -0,0 +1,31 @@
+"""Персональные и часто меняющиеся фрагменты страниц постов.
+
+Страницы кэшируются целиком (core.holes), а эти куски рендерятся
+заново на каждый запрос.
+"""
+from core import holes
+
+from .forms import CommentForm
+from .models import Follow, UserStats
+
+
+@holes.register('follow_button')
+def follow_button(request, author):
+    following = request.user.is_authenticated and Follow.objects.filter(
+        user=request.user, author__username=author
+    ).exists()
+    return {'following': following}
+
+
+@holes.register('author_posts')
+def author_posts(request, author):
+    # Счётчик меняется с каждым постом автора, а страница поста — нет.
+    count = UserStats.objects.filter(user_id=author).values_list(
+        'posts_count', flat=True
+    ).first()
+    return {'count_post': count or 0}
+
+
+@holes.register('comment_form')
+def comment_form(request, post):
+    return {'form': CommentForm()}
@@ -0,0 +1,73 @@
+"""Адаптивные варианты картинок постов.
+
+Из оригинала нарезается кадр карточки нескольких ширин в каждом
+доступном формате: WebP, если Pillow собран с ним, и JPEG всегда.
+Файлы лежат по пути из хэша содержимого оригинала
+(variants/ab/cd/<хэш>-<ширина>.<формат>), поэтому одинаковые загрузки
+не дублируются, а адрес варианта можно кэшировать навсегда.
+"""
+import hashlib
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, features
+
+VARIANTS_DIR = 'variants'
+HASH_LENGTH = 20
+
+# MIME-тип -> (формат Pillow, расширение, параметры сохранения)
+FORMATS = {
+    'image/webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+    'image/jpeg': (
+        'JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}
+    ),
+}
+
+
+def available_formats():
+    """Форматы в порядке предпочтения, которые умеет текущий Pillow."""
+    return [
+        mime for mime in FORMATS
+        if mime != 'image/webp' or features.check('webp')
+    ]
+
+
+def variant_name(digest, width, extension):
+    return (
+        f'{VARIANTS_DIR}/{digest[:2]}/{digest[2:4]}/'
+        f'{digest}-{width}.{extension}'
+    )
+
+
+def build_variants(image):
+    """Нарезает варианты и возвращает {mime: [[ширина, адрес], ...]}."""
+    with image.open('rb') as source:
+        data = source.read()
+    digest = hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+    ratio_width, ratio_height = settings.POST_IMAGE_RATIO
+    widths = sorted(settings.POST_IMAGE_WIDTHS)
+    with Image.open(BytesIO(data)) as original:
+        # Для JPEG декодер сразу уменьшает картинку до нужного масштаба.
+        original.draft('RGB', (widths[-1], widths[-1]))
+        original = ImageOps.exif_transpose(original).convert('RGB')
+        # Шире оригинала не растягиваем, но один вариант нужен всегда.
+        widths = [width for width in widths if width <= original.width] or [
+            widths[0]
+        ]
+        variants = {}
+        for width in widths:
+            height = round(width * ratio_height / ratio_width)
+            frame = ImageOps.fit(original, (width, height), Image.LANCZOS)
+            for mime in available_formats():
+                pil_format, extension, params = FORMATS[mime]
+                name = variant_name(digest, width, extension)
+                if not default_storage.exists(name):
+                    buffer = BytesIO()
+                    frame.save(buffer, pil_format, **params)
+                    default_storage.save(name, ContentFile(buffer.getvalue()))
+                variants.setdefault(mime, []).append(
+                    [width, default_storage.url(name)]
+                )
+    return variants
@@ -0,0 +1,275 @@
+"""Потоковый импорт пользователей, групп, постов, комментариев и подписок.
+
+Вход — JSONL (запись на строку, тип в поле type) или CSV (одна таблица
+на файл, тип задаётся отдельно), можно сжатые gzip (.gz), например
+выгрузку export_yatube. Поля записей:
+
+    user     username, first_name, last_name, email, password (хэш)
+    group    slug, title, description
+    post     id, author (username), group (slug), text, pub_date
+    comment  post (id поста), author, text, created
+    follow   user, author (оба username)
+
+Записи копятся порциями и пишутся bulk_create без сигналов: авторы и
+группы ищутся по словарям username → id и slug → id в памяти, посты
+сохраняют свои id, чтобы на них ссылались комментарии. Пост, чей id уже
+занят, пропускается, а комментарии привязываются только к постам,
+загруженным из этих же файлов. Каждая порция пишется одной транзакцией
+вместе с контрольной точкой (ImportCheckpoint), так что прерванный импорт
+продолжается с первой незаписанной записи; посты из уже записанной части
+файла сопоставляются заново. Записи со ссылками на неизвестных авторов,
+группы и посты пропускаются.
+"""
+import csv
+import gzip
+import json
+import os
+from collections import Counter
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .bulk import BATCH_SIZE, batches, insert
+from .models import Comment, Follow, Group, ImportCheckpoint, Post, User
+
+# Порядок записи порции: сначала то, на что ссылаются остальные.
+TYPES = ('user', 'group', 'post', 'comment', 'follow')
+FORMATS = ('jsonl', 'csv')
+LOOKUP_BATCH = 500  # параметров в одном IN (...)
+
+
+def guess_format(path):
+    if path.endswith('.gz'):
+        path = path[:-3]
+    extension = os.path.splitext(path)[1].lstrip('.').lower()
+    return 'jsonl' if extension in ('json', 'ndjson') else extension
+
+
+def guess_type(path):
+    """Тип записей CSV по имени файла: posts.csv — post."""
+    name = os.path.basename(path).split('.')[0].lower()
+    name = name[:-1] if name.endswith('s') else name
+    return name if name in TYPES else None
+
+
+def read_records(path, file_format, record_type=None):
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', newline='', encoding='utf-8') as source:
+        if file_format == 'csv':
+            for record in csv.DictReader(source):
+                yield record_type, record
+            return
+        for line in source:
+            if line.strip():
+                record = json.loads(line)
+                yield record.pop('type', record_type), record
+
+
+def parse_date(value):
+    if not value:
+        return timezone.now()
+    moment = parse_datetime(value)
+    if moment is None:
+        raise ValueError(f'Неверная дата: {value}')
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+class Importer:
+
+    def __init__(self):
+        self.users = dict(User.objects.values_list('username', 'pk'))
+        self.groups = dict(Group.objects.values_list('slug', 'pk'))
+        # id постов, загруженных из файлов: только на них ссылаются
+        # комментарии. restoring — посты записанной ранее части файла
+        # (id → автор), их ещё надо найти в базе.
+        self.post_ids = set()
+        self.restoring = {}
+        self.pending = {record_type: [] for record_type in TYPES}
+        self.stats = Counter()
+
+    def add(self, record_type, record):
+        if record_type not in self.pending:
+            raise ValueError(f'Неизвестный тип записи: {record_type}')
+        self.pending[record_type].append(record)
+
+    def restore(self, record_type, record):
+        """Запоминает пост из уже загруженной части файла, чтобы
+        комментарии дальше по файлу снова могли на него ссылаться."""
+        if record_type != 'post' or not record.get('id'):
+            return
+        author_id = self.users.get(record.get('author'))
+        if author_id is not None:
+            self.restoring[int(record['id'])] = author_id
+
+    def _restore_posts(self):
+        for batch in batches(list(self.restoring), LOOKUP_BATCH):
+            self.post_ids.update(
+                pk for pk, author_id in Post.objects.filter(
+                    pk__in=batch
+                ).values_list('pk', 'author_id')
+                if self.restoring[pk] == author_id
+            )
+        self.restoring = {}
+
+    def flush(self):
+        """Пишет накопленные записи всех типов."""
+        self._restore_posts()
+        for record_type in TYPES:
+            records = self.pending[record_type]
+            if records:
+                getattr(self, f'_write_{record_type}s')(records)
+                self.pending[record_type] = []
+
+    def _count(self, record_type, total, written):
+        self.stats[f'{record_type}: загружено'] += written
+        if total > written:
+            self.stats[f'{record_type}: пропущено'] += total - written
+
+    def _write_users(self, records):
+        usernames = set(self.users)
+        users = []
+        for record in records:
+            username = record['username']
+            if username in usernames:
+                continue
+            usernames.add(username)
+            users.append(User(
+                username=username,
+                first_name=record.get('first_name') or '',
+                last_name=record.get('last_name') or '',
+                email=record.get('email') or '',
+                password=record.get('password') or make_password(None),
+            ))
+        User.objects.bulk_create(users, ignore_conflicts=True)
+        for batch in batches(
+            (user.username for user in users), LOOKUP_BATCH
+        ):
+            self.users.update(User.objects.filter(
+                username__in=batch
+            ).values_list('username', 'pk'))
+        self._count('user', len(records), len(users))
+
+    def _write_groups(self, records):
+        slugs = set(self.groups)
+        groups = []
+        for record in records:
+            if record['slug'] in slugs:
+                continue
+            slugs.add(record['slug'])
+            groups.append(Group(
+                slug=record['slug'],
+                title=record.get('title') or record['slug'],
+                description=record.get('description') or '',
+            ))
+        Group.objects.bulk_create(groups, ignore_conflicts=True)
+        self.groups.update(Group.objects.filter(
+            slug__in=[group.slug for group in groups]
+        ).values_list('slug', 'pk'))
+        self._count('group', len(records), len(groups))
+
+    def _write_posts(self, records):
+        # Занятый id не перезаписываем: иначе пост молча потерялся бы,
+        # а его комментарии достались бы чужому посту.
+        taken = self._existing_posts(
+            int(record['id']) for record in records if record.get('id')
+        )
+        posts = []
+        for record in records:
+            author_id = self.users.get(record.get('author'))
+            group = record.get('group')
+            group_id = self.groups.get(group) if group else None
+            if author_id is None or (group and group_id is None):
+                continue
+            post_id = int(record['id']) if record.get('id') else None
+            if post_id is not None:
+                if post_id in taken:
+                    continue
+                taken.add(post_id)
+            posts.append(Post(
+                id=post_id,
+                author_id=author_id,
+                group_id=group_id,
+                text=record['text'],
+                pub_date=parse_date(record.get('pub_date')),
+            ))
+        insert(posts)
+        self.post_ids.update(post.pk for post in posts if post.pk)
+        self._count('post', len(records), len(posts))
+
+    def _existing_posts(self, ids):
+        existing = set()
+        for batch in batches(set(ids), LOOKUP_BATCH):
+            existing.update(
+                Post.objects.filter(pk__in=batch).values_list('pk', flat=True)
+            )
+        return existing
+
+    def _write_comments(self, records):
+        comments = [
+            Comment(
+                post_id=int(record['post']),
+                author_id=self.users[record.get('author')],
+                text=record['text'],
+                created=parse_date(record.get('created')),
+            )
+            for record in records
+            if int(record['post']) in self.post_ids
+            and record.get('author') in self.users
+        ]
+        insert(comments)
+        self._count('comment', len(records), len(comments))
+
+    def _write_follows(self, records):
+        follows = {
+            (self.users[record['user']], self.users[record['author']])
+            for record in records
+            if record.get('user') in self.users
+            and record.get('author') in self.users
+            and record['user'] != record['author']
+        }
+        Follow.objects.bulk_create(
+            (
+                Follow(user_id=user_id, author_id=author_id)
+                for user_id, author_id in follows
+            ),
+            ignore_conflicts=True,
+        )
+        self._count('follow', len(records), len(follows))
+
+
+def import_file(importer, path, file_format, record_type=None,
+                chunk_size=BATCH_SIZE, restart=False):
+    """Загружает файл порциями по chunk_size записей с контрольными
+    точками. Возвращает False, если файл уже был загружен целиком: тогда
+    из него только сопоставляются посты для следующих файлов."""
+    checkpoint, _ = ImportCheckpoint.objects.get_or_create(
+        source=os.path.abspath(path)
+    )
+    if restart:
+        checkpoint.position = 0
+        checkpoint.finished = False
+    finished = checkpoint.finished
+    position = 0
+    for record_type, record in read_records(path, file_format, record_type):
+        position += 1
+        if finished or position <= checkpoint.position:
+            importer.restore(record_type, record)
+            continue
+        importer.add(record_type, record)
+        if position % chunk_size == 0:
+            with transaction.atomic():
+                importer.flush()
+                checkpoint.position = position
+                checkpoint.save()
+    if finished:
+        return False
+    with transaction.atomic():
+        importer.flush()
+        checkpoint.position = position
+        checkpoint.finished = True
+        checkpoint.save()
+    return True
@@ -0,0 +1,181 @@
+"""Отложенная запись постов и комментариев (write-behind).
+
+При settings.WRITE_BEHIND = True view не пишет в базу сам, а кладёт
+объект в очередь процесса. Фоновый поток забирает очередь пачками (не
+больше WRITE_BEHIND_BATCH_SIZE объектов и не дольше
+WRITE_BEHIND_FLUSH_INTERVAL секунд ожидания) и сохраняет каждую пачку
+одной транзакцией: на SQLite это одна блокировка базы вместо сотни.
+Объекты сохраняются обычным save(), так что сигналы (счётчики, ленты,
+поиск, кэш) работают как прежде.
+
+Чтобы автор сразу видел своё, число его несохранённых объектов лежит в
+общем кэше, и WaitForOwnWritesMiddleware придерживает его следующий
+запрос (в любом воркере), пока пачка не запишется. При остановке
+процесса очередь дописывается до конца. С WRITE_BEHIND_SYNC и на базе
+SQLite в памяти фонового потока нет и очередь пишет только drain() — это
+для тестов.
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, connections, transaction
+
+from core.sqlite import in_memory_db
+
+logger = logging.getLogger(__name__)
+
+PENDING_KEY = 'ingest:pending:{}'
+PENDING_TIMEOUT = 60  # на случай, если воркер умер с непустой очередью
+POLL_INTERVAL = 0.02
+
+
+def enabled():
+    return settings.WRITE_BEHIND
+
+
+def pending_key(user_id):
+    return PENDING_KEY.format(user_id)
+
+
+class WriteBehindQueue:
+
+    def __init__(self):
+        self.items = queue.Queue(maxsize=settings.WRITE_BEHIND_QUEUE_SIZE)
+        self.lock = threading.Lock()
+        self.thread = None
+        self.stopping = False
+
+    def put(self, obj, user_id):
+        """Ставит объект в очередь; при переполнении пишет сразу."""
+        self._mark_pending(user_id, 1)
+        try:
+            self.items.put_nowait((obj, user_id))
+        except queue.Full:
+            self.write([(obj, user_id)])
+            return
+        self._ensure_thread()
+
+    def drain(self):
+        """Записывает всё, что есть в очереди, в текущем потоке."""
+        batch = []
+        while True:
+            try:
+                batch.append(self.items.get_nowait())
+            except queue.Empty:
+                break
+            if len(batch) >= settings.WRITE_BEHIND_BATCH_SIZE:
+                self.write(batch)
+                batch = []
+        if batch:
+            self.write(batch)
+
+    def stop(self):
+        self.stopping = True
+        if self.thread is not None:
+            self.thread.join()
+        self.drain()
+
+    def write(self, batch):
+        try:
+            with transaction.atomic():
+                for obj, user_id in batch:
+                    obj.save()
+        except Exception:
+            # Пачка откатилась целиком: пишем по одному, чтобы один
+            # плохой объект (например, к удалённому посту) не утянул
+            # за собой остальные.
+            logger.exception('Пачка из %s записей не записалась', len(batch))
+            for obj, user_id in batch:
+                # Откат не вернул объекту состояние «ещё не в базе».
+                obj.pk = None
+                obj._state.adding = True
+                try:
+                    with transaction.atomic():
+                        obj.save()
+                except Exception:
+                    logger.exception('Не удалось записать %r', obj)
+        for obj, user_id in batch:
+            self._mark_pending(user_id, -1)
+
+    def _mark_pending(self, user_id, delta):
+        key = pending_key(user_id)
+        try:
+            cache.incr(key, delta)
+        except ValueError:
+            if delta > 0:
+                cache.add(key, 0, PENDING_TIMEOUT)
+                cache.incr(key, delta)
+
+    def _ensure_thread(self):
+        if settings.WRITE_BEHIND_SYNC or in_memory_db(connection):
+            return
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(
+                    target=self._loop, name='write-behind', daemon=True
+                )
+                self.thread.start()
+
+    def _loop(self):
+        try:
+            while not self.stopping:
+                try:
+                    batch = [self.items.get(timeout=POLL_INTERVAL * 10)]
+                except queue.Empty:
+                    continue
+                deadline = time.monotonic() + (
+                    settings.WRITE_BEHIND_FLUSH_INTERVAL
+                )
+                while len(batch) < settings.WRITE_BEHIND_BATCH_SIZE:
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(self.items.get(timeout=timeout))
+                    except queue.Empty:
+                        break
+                self.write(batch)
+        finally:
+            connections.close_all()
+
+
+writer = WriteBehindQueue()
+atexit.register(writer.stop)
+
+
+def save(obj, user_id):
+    """Сохраняет объект сразу или через очередь, если она включена."""
+    if enabled():
+        writer.put(obj, user_id)
+    else:
+        obj.save()
+
+
+def wait_for_own_writes(user_id, timeout=None):
+    """Ждёт, пока запишутся объекты пользователя из очередей всех
+    воркеров; True, если дождались."""
+    if timeout is None:
+        timeout = settings.WRITE_BEHIND_FLUSH_INTERVAL * 10
+    deadline = time.monotonic() + timeout
+    while cache.get(pending_key(user_id)):
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(POLL_INTERVAL)
+    return True
+
+
+class WaitForOwnWritesMiddleware:
+    """Read-your-own-write для авторов записей из очереди."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if enabled() and request.user.is_authenticated:
+            wait_for_own_writes(request.user.pk)
+        return self.get_response(request)
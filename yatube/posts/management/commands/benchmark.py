@@ -0,0 +1,73 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет задержки и число запросов страниц и форм posts и '
+        'сравнивает с базовым прогоном. Данные — seed_benchmark.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Очищать кэш перед каждым запросом',
+        )
+        parser.add_argument(
+            '--baseline',
+            default=os.path.join(settings.BASE_DIR, 'benchmark.json'),
+        )
+        parser.add_argument(
+            '--save-baseline', action='store_true',
+            help='Записать этот прогон как базовый',
+        )
+        parser.add_argument(
+            '--tolerance', type=float, default=benchmarks.DEFAULT_TOLERANCE,
+        )
+
+    def handle(self, *args, **options):
+        results = benchmarks.run(
+            options['iterations'], options['warmup'], options['cold']
+        )
+        if not results:
+            raise CommandError('Нет данных: сначала seed_benchmark')
+        self.stdout.write(
+            f'{"сценарий":<14}{"p50, мс":>9}{"p95, мс":>9}'
+            f'{"p99, мс":>9}{"запросов":>10}'
+        )
+        for name, result in results.items():
+            self.stdout.write(
+                f'{name:<14}{result["p50"]:>9.1f}{result["p95"]:>9.1f}'
+                f'{result["p99"]:>9.1f}{result["queries"]:>10}'
+            )
+        # Прогоны с кэшем и без сравниваются каждый со своим базовым.
+        mode = 'cold' if options['cold'] else 'warm'
+        path = options['baseline']
+        baselines = {}
+        if os.path.exists(path):
+            with open(path) as baseline:
+                baselines = json.load(baseline)
+        if options['save_baseline']:
+            baselines[mode] = results
+            with open(path, 'w') as baseline:
+                json.dump(baselines, baseline, indent=2)
+            self.stdout.write(f'Базовый прогон ({mode}) записан в {path}')
+            return
+        if mode not in baselines:
+            return
+        regressions = benchmarks.compare(
+            results, baselines[mode], options['tolerance']
+        )
+        if regressions:
+            raise CommandError(
+                'Регрессии относительно базового прогона:\n'
+                + '\n'.join(regressions)
+            )
+        self.stdout.write('Регрессий относительно базового прогона нет')
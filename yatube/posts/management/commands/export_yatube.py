@@ -0,0 +1,37 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import exports
+from posts.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает данные сайта или одного пользователя в JSONL.gz, '
+        'который загружается обратно командой import_yatube'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default='yatube.jsonl.gz',
+            help='Файл выгрузки; «-» — стандартный вывод',
+        )
+        parser.add_argument('--user', help='username пользователя')
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            user = User.objects.filter(username=options['user']).first()
+            if user is None:
+                raise CommandError(f'Нет пользователя {options["user"]}')
+        path = options['path']
+        target = sys.stdout.buffer if path == '-' else open(path, 'wb')
+        try:
+            for chunk in exports.export(user):
+                target.write(chunk)
+        finally:
+            if target is not sys.stdout.buffer:
+                target.close()
+        if path != '-':
+            self.stdout.write(f'Выгрузка записана в {path}')
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Нарезает превью картинок постов, у которых их ещё нет'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='нарезать заново и уже готовые превью',
+        )
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='')
+        if not options['all']:
+            posts = posts.filter(thumbnails='')
+        generated = 0
+        for pk in posts.values_list('pk', flat=True).iterator():
+            generated += thumbnails.generate(pk)
+        self.stdout.write(f'Нарезано превью: {generated}')
@@ -0,0 +1,67 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection
+
+from posts import imports
+from posts.bulk import BATCH_SIZE, rebuild_derived
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает пользователей, группы, посты, комментарии и подписки '
+        'из JSONL или CSV порциями через bulk_create. Прерванный импорт '
+        'продолжается с места остановки; формат записей — posts/imports.py.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+')
+        parser.add_argument('--format', choices=imports.FORMATS)
+        parser.add_argument(
+            '--type', choices=imports.TYPES,
+            help='Тип записей CSV (по умолчанию — по имени файла)',
+        )
+        parser.add_argument('--chunk-size', type=int, default=BATCH_SIZE)
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='Загружать файлы с начала, а не с контрольной точки',
+        )
+        parser.add_argument(
+            '--no-rebuild', action='store_true',
+            help='Не пересобирать счётчики, ленты и поиск после загрузки',
+        )
+
+    def source(self, path, options):
+        """Формат файла и тип записей CSV."""
+        file_format = options['format'] or imports.guess_format(path)
+        if file_format not in imports.FORMATS:
+            raise CommandError(f'{path}: неизвестный формат')
+        record_type = options['type']
+        if file_format == 'csv':
+            record_type = record_type or imports.guess_type(path)
+            if record_type is None:
+                raise CommandError(f'{path}: укажите --type')
+        return file_format, record_type
+
+    def handle(self, *args, **options):
+        importer = imports.Importer()
+        for path in options['paths']:
+            file_format, record_type = self.source(path, options)
+            try:
+                loaded = imports.import_file(
+                    importer, path, file_format, record_type,
+                    options['chunk_size'], options['restart'],
+                )
+            except (KeyError, ValueError) as error:
+                raise CommandError(f'{path}: {error!r}')
+            if not loaded:
+                self.stdout.write(f'{path}: уже загружен, пропущен')
+        # Посты приходят со своими id: счётчик последовательности должен
+        # их обогнать (на SQLite запросов нет).
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), [Post]):
+                cursor.execute(sql)
+        if not options['no_rebuild']:
+            rebuild_derived()
+        for name, count in sorted(importer.stats.items()):
+            self.stdout.write(f'{name}: {count}')
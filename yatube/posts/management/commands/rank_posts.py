@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import ranking
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает популярные и трендовые посты сайта и групп; '
+        'запускайте периодически (cron)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'kinds', nargs='*',
+            help='Какие ленты считать: popular, trending (по умолчанию все)',
+        )
+
+    def handle(self, *args, **options):
+        unknown = set(options['kinds']) - set(ranking.KINDS)
+        if unknown:
+            raise CommandError(
+                f'Неизвестные ленты: {", ".join(sorted(unknown))}'
+            )
+        for kind in options['kinds'] or ranking.KINDS:
+            feeds = ranking.refresh(kind)
+            self.stdout.write(
+                f'{kind}: {len(feeds[ranking.SITE])} постов, '
+                f'групп {len(feeds) - 1}'
+            )
@@ -0,0 +1,25 @@
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+
+from posts import timeline
+from posts.models import User
+
+
+class Command(BaseCommand):
+    help = 'Заново собирает ленты подписок (всех или указанных пользователей)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('usernames', nargs='*')
+
+    def handle(self, *args, **options):
+        if not options['usernames']:
+            entries = timeline.rebuild_all()
+            self.stdout.write(f'Все ленты пересобраны, записей: {entries}')
+            return
+        cache.delete(timeline.CELEBRITIES_KEY)
+        users = User.objects.filter(username__in=options['usernames'])
+        rebuilt = 0
+        for user in users.iterator():
+            timeline.rebuild(user)
+            rebuilt += 1
+        self.stdout.write(f'Лент пересобрано: {rebuilt}')
@@ -0,0 +1,77 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from posts.bulk import batches
+from posts.models import Follow, Post, User, UserStats
+
+BATCH_SIZE = 500
+
+
+def count_by_user(model, field):
+    """Число строк model, где field — этот пользователь.
+
+    Отдельный подзапрос на каждый счётчик: два JOIN к постам и подпискам
+    дали бы посты × подписчиков строк на пользователя.
+    """
+    rows = model.objects.filter(**{field: OuterRef('pk')}).order_by()
+    return Coalesce(
+        Subquery(
+            rows.values(field).annotate(count=Count('*')).values('count'),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+
+
+class Command(BaseCommand):
+    help = 'Сверяет денормализованные счётчики с таблицами и чинит расхождения'
+
+    def handle(self, *args, **options):
+        users = User.objects.annotate(
+            real_posts=count_by_user(Post, 'author'),
+            real_followers=count_by_user(Follow, 'author'),
+        ).values_list('pk', 'real_posts', 'real_followers')
+        stored = dict(
+            (pk, (posts, followers))
+            for pk, posts, followers in UserStats.objects.values_list(
+                'user_id', 'posts_count', 'followers_count'
+            )
+        )
+        missing = []
+        drifted = []
+        for pk, posts, followers in users.iterator():
+            if stored.get(pk) == (posts, followers):
+                continue
+            stats = UserStats(
+                user_id=pk, posts_count=posts, followers_count=followers
+            )
+            (drifted if pk in stored else missing).append(stats)
+        # После массовой загрузки расходятся все: пишем пачками.
+        UserStats.objects.bulk_create(missing, batch_size=BATCH_SIZE)
+        UserStats.objects.bulk_update(
+            drifted, ['posts_count', 'followers_count'],
+            batch_size=BATCH_SIZE,
+        )
+        fixed_users = len(missing) + len(drifted)
+
+        drifted_posts = Post.objects.annotate(
+            real_comments=Count('comments')
+        ).exclude(comments_count=F('real_comments')).values_list(
+            'pk', 'real_comments'
+        )
+        fixed_posts = 0
+        for batch in batches(
+            (
+                Post(pk=pk, comments_count=comments)
+                for pk, comments in drifted_posts.iterator()
+            ),
+            BATCH_SIZE,
+        ):
+            Post.objects.bulk_update(batch, ['comments_count'])
+            fixed_posts += len(batch)
+
+        self.stdout.write(
+            f'Исправлено счётчиков: пользователей {fixed_users}, '
+            f'постов {fixed_posts}'
+        )
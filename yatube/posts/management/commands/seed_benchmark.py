@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from posts import benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        'Наполняет базу синтетическими данными для замеров: по умолчанию '
+        '100 тыс. пользователей, 1 млн постов, 1 млн комментариев и '
+        'подписки с перекосом. Запускайте на отдельной базе (DB_NAME).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100_000)
+        parser.add_argument('--posts', type=int, default=1_000_000)
+        parser.add_argument('--comments', type=int, default=1_000_000)
+        parser.add_argument('--groups', type=int, default=100)
+        parser.add_argument('--follows-per-user', type=int, default=10)
+        parser.add_argument(
+            '--scale', type=float, default=1.0,
+            help='Множитель всех объёмов, например 0.01 для пробы',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        scale = options['scale']
+        # Без общей транзакции: пачки коммитятся по одной, а не держат
+        # блокировку базы и журнал на всю загрузку.
+        benchmarks.seed(
+            users=max(2, int(options['users'] * scale)),
+            posts=max(1, int(options['posts'] * scale)),
+            comments=int(options['comments'] * scale),
+            groups=max(1, int(options['groups'] * scale)),
+            follows_per_user=options['follows_per_user'],
+            random_seed=options['seed'],
+            log=self.stdout.write,
+        )
+        self.stdout.write('Готово')
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_post_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False, help_text='Растёт при каждом изменении поста', verbose_name='Версия'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+from django.db import migrations
+
+# Для других баз таблицы нет, posts.search ищет через LIKE.
+CREATE_TABLE = (
+    "CREATE VIRTUAL TABLE posts_search USING fts5("
+    "text, comments, tokenize = 'unicode61 remove_diacritics 2')"
+)
+FILL_TABLE = (
+    "INSERT INTO posts_search (rowid, text, comments) "
+    "SELECT id, text, COALESCE(("
+    "SELECT group_concat(text, ' ') FROM posts_comment "
+    "WHERE post_id = posts_post.id), '') "
+    "FROM posts_post"
+)
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(CREATE_TABLE)
+    schema_editor.execute(FILL_TABLE)
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute('DROP TABLE posts_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0018_post_thumbnails'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,45 @@
+from django.db import migrations
+
+# Комментарии индексируются каждый своей строкой, а не склейкой всех
+# комментариев поста в одной колонке.
+TOKENIZE = "tokenize = 'unicode61 remove_diacritics 2'"
+FORWARD = [
+    'DROP TABLE posts_search',
+    f'CREATE VIRTUAL TABLE posts_search USING fts5(text, {TOKENIZE})',
+    'INSERT INTO posts_search (rowid, text) SELECT id, text FROM posts_post',
+    'CREATE VIRTUAL TABLE posts_comment_search USING fts5('
+    f'text, post_id UNINDEXED, {TOKENIZE})',
+    'INSERT INTO posts_comment_search (rowid, text, post_id) '
+    'SELECT id, text, post_id FROM posts_comment',
+]
+BACKWARD = [
+    'DROP TABLE posts_comment_search',
+    'DROP TABLE posts_search',
+    'CREATE VIRTUAL TABLE posts_search USING fts5('
+    f'text, comments, {TOKENIZE})',
+    "INSERT INTO posts_search (rowid, text, comments) "
+    "SELECT id, text, COALESCE(("
+    "SELECT group_concat(text, ' ') FROM posts_comment "
+    "WHERE post_id = posts_post.id), '') "
+    "FROM posts_post",
+]
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0020_import_checkpoint'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(FORWARD), run(BACKWARD)),
+    ]
@@ -0,0 +1,35 @@
+from django.db import migrations
+
+# На PostgreSQL поиск (posts.search) идёт по to_tsvector прямо по
+# таблицам: индексам хватает того же выражения, что и в запросе.
+CONFIG = 'russian'
+FORWARD = [
+    'CREATE INDEX posts_post_search_idx ON posts_post '
+    f"USING GIN (to_tsvector('{CONFIG}', text))",
+    'CREATE INDEX posts_comment_search_idx ON posts_comment '
+    f"USING GIN (to_tsvector('{CONFIG}', text))",
+]
+BACKWARD = [
+    'DROP INDEX IF EXISTS posts_comment_search_idx',
+    'DROP INDEX IF EXISTS posts_post_search_idx',
+]
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0021_comment_search'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(FORWARD), run(BACKWARD)),
+    ]
@@ -1,9 +1,26 @@
+import json
+
 from django.db import models
 from django.contrib.auth import get_user_model
 from django.urls import reverse
+from django.utils.functional import cached_property
 
 User = get_user_model()
 
+# Поля, которые нужны карточке поста в лентах и ключу паджинатора
+LISTING_FIELDS = (
+    'id', 'text', 'pub_date', 'image', 'thumbnails', 'version',
+    'author', 'author__username', 'author__first_name', 'author__last_name',
+    'group', 'group__slug',
+)
+
+
+class PostQuerySet(models.QuerySet):
+    def for_listing(self):
+        """Посты для лент: автор и группа одним запросом, без лишних
+        колонок."""
+        return self.select_related('author', 'group').only(*LISTING_FIELDS)
+
 
 class Post(models.Model):
     text = models.TextField(
@@ -34,15 +51,66 @@ class Post(models.Model):
         upload_to='posts/',
         blank=True
     )
+    thumbnails = models.TextField(
+        'Превью',
+        blank=True,
+        default='',
+        editable=False,
+        help_text='Адреса готовых превью картинки в JSON',
+    )
+    comments_count = models.PositiveIntegerField(
+        'Комментариев',
+        default=0,
+        editable=False,
+    )
+    version = models.PositiveIntegerField(
+        'Версия',
+        default=1,
+        editable=False,
+        help_text='Растёт при каждом изменении поста',
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = [('-pub_date')]
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        # Покрывают ключ паджинатора (pub_date, id) для лент
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='post_pub_date_idx',
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_pub_date_idx',
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_pub_date_idx',
+            ),
+        ]
 
     def __str__(self) -> str:
         return self.text[:15]
 
+    @cached_property
+    def thumbnail_urls(self):
+        return json.loads(self.thumbnails) if self.thumbnails else {}
+
+    def save(self, *args, **kwargs):
+        updating = not self._state.adding
+        if updating:
+            # Версию поднимает и нарезка превью (posts.thumbnails): только
+            # через F(), иначе одно из двух увеличений потеряется.
+            self.version = models.F('version') + 1
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'version'}
+        super().save(*args, **kwargs)
+        if updating:
+            self.refresh_from_db(fields=['version'])
+
 
 class Group(models.Model):
     title = models.CharField(max_length=200, verbose_name='Заголовок')
@@ -52,6 +120,15 @@ class Group(models.Model):
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        self.slug_changed = self.pk is not None and Group.objects.filter(
+            pk=self.pk
+        ).exclude(slug=self.slug).exists()
+        super().save(*args, **kwargs)
+        if self.slug_changed:
+            # Карточки постов ссылаются на группу по slug.
+            self.posts.update(version=models.F('version') + 1)
+
     def get_absolute_url(self):
         return reverse("group_posts", kwargs={"slug": self.slug})
 
@@ -78,6 +155,16 @@ class Comment(models.Model):
         auto_now_add=True,
     )
 
+    class Meta:
+        ordering = ('created', 'id')
+        # Комментарии поста читаются страницами по ключу (created, id)
+        indexes = [
+            models.Index(
+                fields=['post', 'created', 'id'],
+                name='comment_post_created_idx',
+            ),
+        ]
+
 
 class Follow(models.Model):
     user = models.ForeignKey(
@@ -100,3 +187,76 @@ class Follow(models.Model):
 
     def __str__(self):
         return self.user, self.author
+
+
+class UserStats(models.Model):
+    """Счётчики пользователя, которые обновляются вместе с записью
+    постов и подписок, чтобы страницы не считали их агрегатами.
+    """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь',
+    )
+    posts_count = models.PositiveIntegerField('Постов', default=0)
+    followers_count = models.PositiveIntegerField(
+        'Подписчиков',
+        default=0,
+        db_index=True,
+    )
+
+    class Meta:
+        verbose_name = 'Счётчики пользователя'
+        verbose_name_plural = 'Счётчики пользователей'
+
+
+class TimelineEntry(models.Model):
+    """Готовая лента подписчика: по записи на каждый пост автора,
+    на которого он подписан. pub_date копируется из поста, чтобы
+    лента читалась одним проходом по индексу (user, pub_date).
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Подписчик',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост',
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'], name='unique_timeline_entry'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_pub_date_idx',
+            ),
+        ]
+
+
+class ImportCheckpoint(models.Model):
+    """Сколько записей файла уже загрузил import_yatube. Меняется в той
+    же транзакции, что и загруженная порция, поэтому прерванный импорт
+    продолжается ровно с места остановки.
+    """
+    source = models.CharField('Источник', max_length=500, unique=True)
+    position = models.PositiveIntegerField('Загружено записей', default=0)
+    finished = models.BooleanField('Загружен целиком', default=False)
+    updated = models.DateTimeField('Обновлён', auto_now=True)
+
+    class Meta:
+        verbose_name = 'Контрольная точка импорта'
+        verbose_name_plural = 'Контрольные точки импорта'
@@ -0,0 +1,193 @@
+from django.core.exceptions import ValidationError
+from django.core.paginator import EmptyPage, Page, Paginator
+from django.db.models import Q
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+NEXT = 'n'
+PREVIOUS = 'p'
+NO_NUMBERS = (
+    'Ключевой паджинатор не знает числа записей и номеров страниц: '
+    'листайте курсорами next_cursor и previous_cursor.'
+)
+
+
+def encode_cursor(direction, values):
+    """Упаковывает направление и значения ключа в непрозрачный токен."""
+    raw = '|'.join([direction] + [
+        value.isoformat() if hasattr(value, 'isoformat') else str(value)
+        for value in values
+    ])
+    return urlsafe_base64_encode(raw.encode())
+
+
+def decode_cursor(token):
+    """Распаковывает токен; для битого токена возвращает None."""
+    try:
+        direction, *values = urlsafe_base64_decode(token).decode().split('|')
+    except (TypeError, ValueError, UnicodeDecodeError):
+        return None
+    if direction not in (NEXT, PREVIOUS):
+        return None
+    return direction, values
+
+
+class KeysetPage(Page):
+    """Страница ключевого паджинатора: знает только соседние курсоры."""
+
+    def __init__(self, object_list, paginator, next_cursor, previous_cursor):
+        super().__init__(object_list, None, paginator)
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return '<Keyset page of %s items>' % len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def next_page_number(self):
+        if self.next_cursor is None:
+            raise EmptyPage('Это последняя страница.')
+        return self.next_cursor
+
+    def previous_page_number(self):
+        if self.previous_cursor is None:
+            raise EmptyPage('Это первая страница.')
+        return self.previous_cursor
+
+    def start_index(self):
+        raise AttributeError(NO_NUMBERS)
+
+    def end_index(self):
+        raise AttributeError(NO_NUMBERS)
+
+
+class KeysetPaginator(Paginator):
+    """Постраничный вывод по ключу (seek-пагинация).
+
+    Вместо COUNT(*) и OFFSET каждая страница выбирается условием
+    «строго после/до ключа последней показанной записи», поэтому
+    стоимость любой страницы одинакова. Ключ задаётся как в order_by:
+    ('-pub_date', '-id') — сначала новые записи.
+
+    Вместо одного queryset можно передать список: страницы собираются
+    слиянием всех источников по ключу, записи с одинаковым ключом
+    показываются один раз.
+    """
+
+    def __init__(self, object_list, per_page, ordering=('-pub_date', '-id')):
+        super().__init__(object_list, per_page)
+        if isinstance(object_list, (list, tuple)):
+            self.sources = list(object_list)
+        else:
+            self.sources = [object_list]
+        self.ordering = tuple(ordering)
+        self.fields = tuple(field.lstrip('-') for field in self.ordering)
+
+    # Число записей стоило бы COUNT(*) по всем источникам: его нет.
+    @property
+    def count(self):
+        raise AttributeError(NO_NUMBERS)
+
+    @property
+    def num_pages(self):
+        raise AttributeError(NO_NUMBERS)
+
+    @property
+    def page_range(self):
+        raise AttributeError(NO_NUMBERS)
+
+    def get_page(self, cursor):
+        decoded = decode_cursor(cursor) if cursor else None
+        if decoded is None:
+            return self.page(NEXT, None)
+        direction, values = decoded
+        values = self._parse_values(values)
+        if values is None:
+            return self.page(NEXT, None)
+        return self.page(direction, values)
+
+    def page(self, direction, values):
+        forward = direction == NEXT
+        ordering = self.ordering if forward else tuple(
+            self._flip(field) for field in self.ordering
+        )
+        rows = self._merge(ordering, [
+            row
+            for source in self.sources
+            for row in self._slice(source, ordering, values)
+        ])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if not forward:
+            rows.reverse()
+        next_cursor = previous_cursor = None
+        if rows:
+            if forward and has_more or not forward and values is not None:
+                next_cursor = encode_cursor(NEXT, self._key(rows[-1]))
+            if not forward and has_more or forward and values is not None:
+                previous_cursor = encode_cursor(
+                    PREVIOUS, self._key(rows[0])
+                )
+        return KeysetPage(rows, self, next_cursor, previous_cursor)
+
+    def _slice(self, source, ordering, values):
+        queryset = source.order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(self._seek(ordering, values))
+        return queryset[:self.per_page + 1]
+
+    def _seek(self, ordering, values):
+        # (a, b) < (x, y)  <=>  a < x OR (a = x AND b < y)
+        condition = Q()
+        for position in reversed(range(len(ordering))):
+            field = self.fields[position]
+            lookup = 'lt' if ordering[position].startswith('-') else 'gt'
+            step = Q(**{f'{field}__{lookup}': values[position]})
+            if position < len(ordering) - 1:
+                step |= Q(**{field: values[position]}) & condition
+            condition = step
+        # Избыточная граница по первому полю даёт базе диапазон по индексу.
+        lookup = 'lte' if ordering[0].startswith('-') else 'gte'
+        return Q(**{f'{self.fields[0]}__{lookup}': values[0]}) & condition
+
+    def _merge(self, ordering, rows):
+        if len(self.sources) == 1:
+            return rows
+        unique = {tuple(self._key(row)): row for row in reversed(rows)}
+        rows = list(unique.values())
+        # Устойчивая сортировка с последнего поля ключа к первому.
+        for position in reversed(range(len(ordering))):
+            rows.sort(
+                key=lambda row: self._key(row)[position],
+                reverse=ordering[position].startswith('-'),
+            )
+        return rows
+
+    def _key(self, obj):
+        return [getattr(obj, field) for field in self.fields]
+
+    def _parse_values(self, raw_values):
+        if len(raw_values) != len(self.fields):
+            return None
+        opts = self.sources[0].model._meta
+        values = []
+        for field_name, raw in zip(self.fields, raw_values):
+            field = opts.pk if field_name == 'pk' else opts.get_field(
+                field_name
+            )
+            try:
+                value = field.to_python(raw)
+            except ValidationError:
+                return None
+            if value is None:
+                return None
+            values.append(value)
+        return values
+
+    @staticmethod
+    def _flip(field):
+        return field[1:] if field.startswith('-') else '-' + field
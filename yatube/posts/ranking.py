@@ -0,0 +1,128 @@
+"""Популярные и трендовые посты, посчитанные заранее.
+
+Команда rank_posts (запускается периодически, например cron раз в
+несколько минут) оценивает посты окна WINDOW: чем больше комментариев и
+подписчиков у автора, тем выше, а с возрастом оценка падает как
+(часы + 2) ** GRAVITY. Популярное живёт месяц и стареет медленно,
+трендовое — двое суток и стареет быстро.
+
+Лучшие TOP_N id для всего сайта и для каждой группы лежат в кэше
+массивом array('q') в порядке убывания оценки, так что лента — одно
+чтение из кэша и один запрос постов страницы. Если ленты в кэше нет,
+её одну пересчитывает первый запрос (под блокировкой cache.add), а
+остальные до тех пор получают пустую ленту.
+"""
+import heapq
+import math
+from array import array
+from collections import defaultdict
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from core.cache import bump
+
+from . import scopes
+from .models import Group, Post
+
+KINDS = {
+    'popular': {'window': timedelta(days=30), 'gravity': 0.8},
+    'trending': {'window': timedelta(days=2), 'gravity': 1.8},
+}
+TOP_N = 100
+COMMENT_WEIGHT = 3
+FOLLOWER_WEIGHT = 1
+KEY = 'ranking:{kind}:{slug}'
+SITE = ''  # slug ленты всего сайта в ключе
+LOCK_TIMEOUT = 60  # секунд на пересчёт потерянной ленты
+
+
+def key(kind, slug=None):
+    return KEY.format(kind=kind, slug=slug or SITE)
+
+
+def score(comments, followers, age_hours, gravity):
+    points = (
+        1 + COMMENT_WEIGHT * comments
+        + FOLLOWER_WEIGHT * math.log1p(followers)
+    )
+    return points / (max(age_hours, 0) + 2) ** gravity
+
+
+def _scored(kind, now, posts):
+    """(оценка, id, slug группы) постов из окна ленты kind."""
+    options = KINDS[kind]
+    candidates = posts.filter(
+        pub_date__gte=now - options['window']
+    ).values_list(
+        'pk', 'group__slug', 'comments_count', 'pub_date',
+        'author__stats__followers_count',
+    )
+    for pk, slug, comments, pub_date, followers in candidates.iterator():
+        age_hours = (now - pub_date).total_seconds() / 3600
+        points = score(
+            comments, followers or 0, age_hours, options['gravity']
+        )
+        yield points, pk, slug
+
+
+def _top(entries):
+    return [pk for _, pk in heapq.nlargest(TOP_N, entries)]
+
+
+def compute(kind, now=None):
+    """Лучшие посты сайта и групп: {slug или SITE: [id, ...]}."""
+    by_feed = defaultdict(list)
+    for points, pk, slug in _scored(
+        kind, now or timezone.now(), Post.objects.all()
+    ):
+        by_feed[SITE].append((points, pk))
+        if slug:
+            by_feed[slug].append((points, pk))
+    feeds = {slug: [] for slug in Group.objects.values_list('slug', flat=True)}
+    feeds[SITE] = []
+    for slug, entries in by_feed.items():
+        feeds[slug] = _top(entries)
+    return feeds
+
+
+def compute_feed(kind, slug=None, now=None):
+    """Лучшие посты одной ленты: всего сайта или группы slug."""
+    posts = Post.objects.all()
+    if slug:
+        posts = posts.filter(group__slug=slug)
+    return _top(
+        (points, pk)
+        for points, pk, _ in _scored(kind, now or timezone.now(), posts)
+    )
+
+
+def refresh(kind, now=None):
+    """Пересчитывает ленту kind и сбрасывает кэш её страниц."""
+    feeds = compute(kind, now)
+    cache.set_many(
+        {key(kind, slug): array('q', ids) for slug, ids in feeds.items()},
+        None,
+    )
+    bump(*(scopes.ranking(kind, slug) for slug in feeds))
+    return feeds
+
+
+def post_ids(kind, slug=None):
+    """id постов ленты по убыванию оценки."""
+    ids = cache.get(key(kind, slug))
+    if ids is not None:
+        return list(ids)
+    # Кэш потерян: ленту пересчитывает один запрос, остальные не ждут.
+    lock = key(kind, slug) + ':lock'
+    if not cache.add(lock, True, LOCK_TIMEOUT):
+        return []
+    try:
+        ids = compute_feed(kind, slug)
+        cache.set(key(kind, slug), array('q', ids), None)
+    finally:
+        cache.delete(lock)
+    # Страницы, закэшированные пустыми, пока лента считалась.
+    bump(scopes.ranking(kind, slug))
+    return ids
@@ -0,0 +1,39 @@
+"""Области данных для кэша страниц по поколениям (см. core.cache)."""
+from .models import Group
+
+ALL_POSTS = 'posts'
+
+
+def group(slug):
+    return f'group:{slug}'
+
+
+def author(username):
+    return f'author:{username}'
+
+
+def post(post_id):
+    return f'post:{post_id}'
+
+
+def follows(user_id):
+    """Подписки пользователя: меняют состав его ленты."""
+    return f'follows:{user_id}'
+
+
+def ranking(kind, slug=None):
+    """Лента популярного или трендового (всего сайта или группы)."""
+    return f'ranking:{kind}:{slug or ""}'
+
+
+def for_post(instance, *group_ids):
+    """Области страниц, на которых виден пост."""
+    slugs = Group.objects.filter(
+        pk__in={pk for pk in group_ids if pk is not None}
+    ).values_list('slug', flat=True)
+    return [
+        ALL_POSTS,
+        author(instance.author.username),
+        post(instance.pk),
+        *(group(slug) for slug in slugs),
+    ]
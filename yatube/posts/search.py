@@ -0,0 +1,221 @@
+"""Полнотекстовый поиск по постам и их комментариям.
+
+На SQLite тексты лежат в виртуальных таблицах FTS5: посты в TABLE
+(rowid = id поста), комментарии в COMMENTS_TABLE (rowid = id
+комментария, post_id не индексируется). Поиск идёт по обратным
+индексам, порядок задаёт bm25, совпадение в комментарии весит
+COMMENT_WEIGHT от совпадения в тексте поста. Сигналы переиндексируют
+только изменённую строку: запись комментария не трогает остальные
+комментарии поста.
+
+Стемминга для русского в FTS5 нет, поэтому каждое слово запроса ищется
+как префикс: «пост» найдёт и «посты», и «постами».
+
+На PostgreSQL отдельных таблиц нет: запрос plainto_tsquery сверяется с
+to_tsvector текстов постов и комментариев с конфигурацией
+POSTGRES_CONFIG (со стеммингом), по GIN-индексам на этих выражениях
+(миграция 0022). На остальных базах — простой поиск через LIKE по всей
+таблице.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Comment, Post
+
+TABLE = 'posts_search'
+COMMENTS_TABLE = 'posts_comment_search'
+COMMENT_WEIGHT = 0.5
+SEARCH_LIMIT = 20
+MAX_TERMS = 10
+SNIPPET_TOKENS = 16
+FALLBACK_SNIPPET_LENGTH = 120
+# Совпадает с выражением индексов из миграции 0022, иначе они не
+# используются.
+POSTGRES_CONFIG = 'russian'
+
+# Маркеры подсветки: управляющие символы не встречаются в тексте и
+# переживают экранирование HTML.
+MARK_START = '\x02'
+MARK_END = '\x03'
+
+WORD_RE = re.compile(r'\w+')
+
+
+def enabled():
+    return connection.vendor == 'sqlite'
+
+
+def index_post(post_id):
+    """Переиндексирует текст поста."""
+    if not enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [post_id])
+        cursor.execute(
+            f'INSERT INTO {TABLE} (rowid, text) '
+            f'SELECT id, text FROM {Post._meta.db_table} WHERE id = %s',
+            [post_id],
+        )
+
+
+def index_comment(comment_id):
+    """Переиндексирует один комментарий."""
+    if not enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {COMMENTS_TABLE} WHERE rowid = %s', [comment_id]
+        )
+        cursor.execute(
+            f'INSERT INTO {COMMENTS_TABLE} (rowid, text, post_id) '
+            f'SELECT id, text, post_id FROM {Comment._meta.db_table} '
+            f'WHERE id = %s',
+            [comment_id],
+        )
+
+
+def reindex():
+    """Строит индекс всех постов и комментариев заново (после массовой
+    загрузки)."""
+    if not enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE}')
+        cursor.execute(
+            f'INSERT INTO {TABLE} (rowid, text) '
+            f'SELECT id, text FROM {Post._meta.db_table}'
+        )
+        cursor.execute(f'DELETE FROM {COMMENTS_TABLE}')
+        cursor.execute(
+            f'INSERT INTO {COMMENTS_TABLE} (rowid, text, post_id) '
+            f'SELECT id, text, post_id FROM {Comment._meta.db_table}'
+        )
+
+
+def remove_post(post_id):
+    # Комментарии поста удаляются каскадом и убирают себя сами.
+    if not enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [post_id])
+
+
+def remove_comment(comment_id):
+    if not enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {COMMENTS_TABLE} WHERE rowid = %s', [comment_id]
+        )
+
+
+def terms(query):
+    return WORD_RE.findall(query.lower())[:MAX_TERMS]
+
+
+def highlight(snippet):
+    return mark_safe(
+        escape(snippet).replace(MARK_START, '<mark>').replace(
+            MARK_END, '</mark>'
+        )
+    )
+
+
+def search(query, limit=SEARCH_LIMIT):
+    """Найденные посты по убыванию релевантности: [(пост, фрагмент)]."""
+    words = terms(query)
+    if not words:
+        return []
+    if enabled():
+        found = _search_index(words, limit)
+    elif connection.vendor == 'postgresql':
+        found = _search_postgres(words, limit)
+    else:
+        found = _search_like(words, limit)
+    posts = Post.objects.for_listing().in_bulk([pk for pk, _ in found])
+    return [
+        (posts[pk], highlight(snippet))
+        for pk, snippet in found
+        if pk in posts
+    ]
+
+
+def _search_index(words, limit):
+    # Слова берутся в кавычки, чтобы синтаксис FTS5 из запроса
+    # пользователя не разбирался; * — поиск по префиксу. От каждого
+    # поста остаётся лучшее совпадение: его текст или один комментарий.
+    match = ' '.join(f'"{word}"*' for word in words)
+    snippet = [MARK_START, MARK_END, '…', SNIPPET_TOKENS]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT post_id, snippet FROM ('
+            f'SELECT post_id, snippet, score, ROW_NUMBER() OVER ('
+            f'PARTITION BY post_id ORDER BY score) AS number FROM ('
+            f'SELECT rowid AS post_id, '
+            f'snippet({TABLE}, 0, %s, %s, %s, %s) AS snippet, '
+            f'bm25({TABLE}) AS score '
+            f'FROM {TABLE} WHERE {TABLE} MATCH %s '
+            f'UNION ALL '
+            f'SELECT post_id, snippet({COMMENTS_TABLE}, 0, %s, %s, %s, %s), '
+            f'bm25({COMMENTS_TABLE}) * %s '
+            f'FROM {COMMENTS_TABLE} WHERE {COMMENTS_TABLE} MATCH %s'
+            f')) WHERE number = 1 ORDER BY score LIMIT %s',
+            snippet + [match] + snippet + [COMMENT_WEIGHT, match, limit],
+        )
+        return cursor.fetchall()
+
+
+def _search_postgres(words, limit):
+    # Фрагмент строится только для найденных постов страницы.
+    vector = f"to_tsvector('{POSTGRES_CONFIG}', text)"
+    options = (
+        f'StartSel={MARK_START}, StopSel={MARK_END}, '
+        f'MaxWords={SNIPPET_TOKENS}, MinWords={SNIPPET_TOKENS // 2}'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT post_id, ts_headline('
+            f"'{POSTGRES_CONFIG}', text, query, %s) FROM ("
+            f'SELECT post_id, text, query, score, ROW_NUMBER() OVER ('
+            f'PARTITION BY post_id ORDER BY score DESC) AS number FROM ('
+            f'SELECT id AS post_id, text, query, '
+            f'ts_rank({vector}, query) AS score '
+            f'FROM {Post._meta.db_table}, '
+            f"plainto_tsquery('{POSTGRES_CONFIG}', %s) query "
+            f'WHERE {vector} @@ query '
+            f'UNION ALL '
+            f'SELECT post_id, text, query, ts_rank({vector}, query) * %s '
+            f'FROM {Comment._meta.db_table}, '
+            f"plainto_tsquery('{POSTGRES_CONFIG}', %s) query "
+            f'WHERE {vector} @@ query'
+            f') found) best WHERE number = 1 ORDER BY score DESC LIMIT %s',
+            [options, ' '.join(words), COMMENT_WEIGHT, ' '.join(words),
+             limit],
+        )
+        return cursor.fetchall()
+
+
+def _search_like(words, limit):
+    condition = Q()
+    for word in words:
+        condition &= Q(text__icontains=word) | Q(
+            comments__text__icontains=word
+        )
+    posts = Post.objects.filter(condition).distinct().values_list(
+        'pk', 'text'
+    )[:limit]
+    return [(pk, _fallback_snippet(text, words)) for pk, text in posts]
+
+
+def _fallback_snippet(text, words):
+    text = text[:FALLBACK_SNIPPET_LENGTH]
+    pattern = re.compile(
+        '|'.join(re.escape(word) for word in words), re.IGNORECASE
+    )
+    return pattern.sub(
+        lambda match: MARK_START + match.group(0) + MARK_END, text
+    )
@@ -0,0 +1,103 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from core.cache import bump
+
+from . import counters, scopes, search, thumbnails, timeline
+from .models import Comment, Follow, Group, Post
+
+
+def bump_post(post, *group_ids):
+    """Сбрасывает кэш страниц, на которых виден пост."""
+    bump(*scopes.for_post(post, *group_ids))
+
+
+@receiver(pre_save, sender=Post)
+def remember_previous(sender, instance, raw=False, **kwargs):
+    instance._previous_group_id = None
+    instance._image_changed = bool(instance.image)
+    if instance.pk is None or raw:
+        return
+    group_id, image = Post.objects.filter(
+        pk=instance.pk
+    ).values_list('group_id', 'image').first() or (None, '')
+    instance._previous_group_id = group_id
+    instance._image_changed = instance.image.name != image
+    if instance._image_changed:
+        # Превью старой картинки больше не подходят.
+        instance.thumbnails = ''
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        counters.change(instance.author_id, posts_count=1)
+        timeline.fan_out(instance)
+    if instance.image and getattr(instance, '_image_changed', False):
+        thumbnails.schedule(instance.pk)
+    search.index_post(instance.pk)
+    bump_post(
+        instance,
+        instance.group_id,
+        getattr(instance, '_previous_group_id', None),
+    )
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.change(instance.author_id, posts_count=-1)
+    search.remove_post(instance.pk)
+    bump_post(instance, instance.group_id)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.change(instance.author_id, followers_count=1)
+        timeline.followers_changed(instance.author_id)
+        timeline.subscribe(instance.user_id, instance.author_id)
+        bump(
+            scopes.author(instance.author.username),
+            scopes.follows(instance.user_id),
+        )
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    counters.change(instance.author_id, followers_count=-1)
+    timeline.unsubscribe(instance.user_id, instance.author_id)
+    timeline.followers_changed(instance.author_id)
+    bump(
+        scopes.author(instance.author.username),
+        scopes.follows(instance.user_id),
+    )
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.change_comments(instance.post_id, 1)
+    if not raw:
+        search.index_comment(instance.pk)
+        bump(scopes.post(instance.post_id))
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.change_comments(instance.post_id, -1)
+    search.remove_comment(instance.pk)
+    bump(scopes.post(instance.post_id))
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    bump(scopes.group(instance.slug))
+    if getattr(instance, 'slug_changed', False):
+        authors = instance.posts.values_list(
+            'author__username', flat=True
+        ).distinct()
+        bump(scopes.ALL_POSTS, *(scopes.author(name) for name in authors))
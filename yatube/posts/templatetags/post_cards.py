@@ -0,0 +1,34 @@
+from django import template
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+register = template.Library()
+
+CARD_TEMPLATE = 'posts/includes/post_card.html'
+CARD_TIMEOUT = 60 * 60 * 24  # устаревшие версии карточек просто истекают
+
+
+def card_key(post):
+    return f'post_card:{post.pk}:{post.version}'
+
+
+@register.simple_tag
+def post_cards(posts):
+    """Карточки постов ленты: готовые берутся из кэша одним get_many,
+    рендерятся только новые или изменённые.
+
+    {% post_cards page_obj as cards %} кладёт в cards список HTML.
+    """
+    posts = list(posts)
+    keys = {card_key(post): post for post in posts}
+    cards = cache.get_many(keys)
+    missing = {
+        key: render_to_string(CARD_TEMPLATE, {'post': post})
+        for key, post in keys.items()
+        if key not in cards
+    }
+    if missing:
+        cache.set_many(missing, CARD_TIMEOUT)
+        cards.update(missing)
+    return [mark_safe(cards[card_key(post)]) for post in posts]
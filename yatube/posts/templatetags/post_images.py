@@ -0,0 +1,34 @@
+from django import template
+
+register = template.Library()
+
+PICTURE_TEMPLATE = 'posts/includes/picture.html'
+# Карточка занимает всю ширину колонки, но не больше 960px
+DEFAULT_SIZES = '(max-width: 960px) 100vw, 960px'
+
+
+def srcset(variants):
+    return ', '.join(f'{url} {width}w' for width, url in variants)
+
+
+@register.inclusion_tag(PICTURE_TEMPLATE)
+def post_picture(post, sizes=DEFAULT_SIZES):
+    """Картинка поста с вариантами для srcset.
+
+    {% post_picture post %} выводит <picture> с источником на каждый
+    формат; браузер сам выбирает формат и ширину. Пока варианты не
+    нарезаны, выводится превью карточки или оригинал.
+    """
+    urls = post.thumbnail_urls
+    variants = urls.get('variants', {})
+    sources = [
+        {'type': mime, 'srcset': srcset(items)}
+        for mime, items in variants.items()
+    ]
+    if urls.get('card'):
+        src = urls['card']
+    elif post.image:
+        src = post.image.url
+    else:
+        src = None
+    return {'sources': sources, 'src': src, 'sizes': sizes}
@@ -1,5 +1,7 @@
 import shutil
 import tempfile
+from io import BytesIO
+from unittest.mock import patch
 
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
@@ -7,9 +9,14 @@ from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
 
 
-from ..models import Group, Post, User
+from .. import ingest, thumbnails
+from ..forms import PostForm
+from ..models import Comment, Group, Post, User
 
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
@@ -120,6 +127,7 @@ class PostFormTests(TestCase):
         )
         self.assertEqual(Post.objects.count(), posts_count + 1)
 
+        cache.clear()
         urls = {
             'posts:index': {},
             'posts:group_list': {'slug': self.group.slug},
@@ -139,3 +147,317 @@ class PostFormTests(TestCase):
                     })
         )
         self.assertTrue(response.context.get('post').image)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailTests(TestCase):
+    SMALL_GIF = (
+        b'\x47\x49\x46\x38\x39\x61\x02\x00'
+        b'\x01\x00\x80\x00\x00\x00\x00\x00'
+        b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+        b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+        b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+        b'\x0A\x00\x3B'
+    )
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user('Stas')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.user)
+        cache.clear()
+
+    def create_post(self):
+        with patch.object(thumbnails, 'schedule') as schedule:
+            self.client.post(reverse('posts:post_create'), data={
+                'text': 'Пост с картинкой',
+                'image': SimpleUploadedFile(
+                    'small.gif', self.SMALL_GIF, content_type='image/gif'
+                ),
+            })
+        post = Post.objects.get(text='Пост с картинкой')
+        schedule.assert_called_once_with(post.pk)
+        return post
+
+    def test_saved_image_schedules_thumbnails(self):
+
+        post = self.create_post()
+
+        with patch.object(thumbnails, 'schedule') as schedule:
+            self.client.post(
+                reverse('posts:post_edit', args=[post.pk]),
+                data={'text': 'Только текст'},
+            )
+        schedule.assert_not_called()
+
+    @override_settings(THUMBNAIL_WORKERS=2)
+    def test_in_memory_db_cuts_thumbnails_in_request_thread(self):
+        post = self.create_post()
+
+        with patch.object(thumbnails, 'executor') as executor:
+            thumbnails.submit(post.pk)
+
+        executor.assert_not_called()
+        post.refresh_from_db()
+        self.assertIn('card', post.thumbnail_urls)
+
+    def test_listing_uses_precomputed_thumbnail_urls(self):
+
+        post = self.create_post()
+        profile_url = reverse('posts:profile', args=[self.user.username])
+        response = self.client.get(profile_url)
+        self.assertContains(response, post.image.url)
+
+        self.assertTrue(thumbnails.generate(post.pk))
+
+        post.refresh_from_db()
+        url = post.thumbnail_urls['card']
+        self.assertNotEqual(url, post.image.url)
+        with patch(
+            'sorl.thumbnail.base.ThumbnailBackend.get_thumbnail'
+        ) as get_thumbnail:
+            response = self.client.get(profile_url)
+            self.client.get(reverse('posts:post_detail', args=[post.pk]))
+        get_thumbnail.assert_not_called()
+        self.assertContains(response, url)
+
+    def test_new_image_drops_old_thumbnails(self):
+
+        post = self.create_post()
+        thumbnails.generate(post.pk)
+        post.refresh_from_db()
+
+        post.image = SimpleUploadedFile(
+            'other.gif', self.SMALL_GIF, content_type='image/gif'
+        )
+        with patch.object(thumbnails, 'schedule') as schedule:
+            post.save()
+
+        schedule.assert_called_once_with(post.pk)
+        post.refresh_from_db()
+        self.assertEqual(post.thumbnails, '')
+
+    def test_edit_keeps_thumbnails_cut_during_request(self):
+
+        post = self.create_post()
+        clean = PostForm.clean
+
+        def clean_while_thumbnails_finish(form):
+            thumbnails.generate(post.pk)
+            return clean(form)
+
+        with patch.object(PostForm, 'clean', clean_while_thumbnails_finish):
+            self.client.post(
+                reverse('posts:post_edit', args=[post.pk]),
+                data={'text': 'Новый текст'},
+            )
+
+        edited = Post.objects.get(pk=post.pk)
+        self.assertEqual(edited.text, 'Новый текст')
+        self.assertIn('card', edited.thumbnail_urls)
+        self.assertEqual(edited.version, post.version + 2)
+
+    def test_variants_are_content_hashed_and_listed_in_srcset(self):
+
+        buffer = BytesIO()
+        Image.new('RGB', (700, 300), 'red').save(buffer, 'PNG')
+        first, second = (
+            Post.objects.create(
+                text=f'Пост {number}', author=self.user,
+                image=SimpleUploadedFile(f'{number}.png', buffer.getvalue()),
+            )
+            for number in range(2)
+        )
+        thumbnails.generate(first.pk)
+        thumbnails.generate(second.pk)
+        first.refresh_from_db()
+        second.refresh_from_db()
+
+        variants = first.thumbnail_urls['variants']
+        self.assertEqual(
+            [width for width, url in variants['image/jpeg']], [320, 640]
+        )
+        self.assertEqual(variants, second.thumbnail_urls['variants'])
+        response = self.client.get(
+            reverse('posts:post_detail', args=[first.pk])
+        )
+        for url in (variants['image/jpeg'][0][1],
+                    variants['image/jpeg'][1][1]):
+            self.assertContains(response, url)
+        self.assertContains(response, 'srcset=')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageUploadLimitTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user('Stas')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    @staticmethod
+    def png(size):
+        buffer = BytesIO()
+        Image.new('RGB', size, 'white').save(buffer, 'PNG')
+        return SimpleUploadedFile('image.png', buffer.getvalue())
+
+    def create_post(self, image):
+        return self.client.post(reverse('posts:post_create'), data={
+            'text': 'Пост с картинкой', 'image': image,
+        })
+
+    @override_settings(POST_IMAGE_MAX_SIZE=200)
+    def test_upload_over_size_limit_is_rejected(self):
+
+        response = self.create_post(self.png((300, 300)))
+
+        self.assertFormError(
+            response, 'form', 'image', 'Файл больше 200\xa0байт.'
+        )
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=10 ** 6)
+    def test_decompression_bomb_is_rejected_by_header(self):
+
+        image = self.png((2000, 1000))
+        with patch.object(Image.Image, 'load') as load:
+            response = self.create_post(image)
+
+        load.assert_not_called()
+        self.assertFormError(
+            response, 'form', 'image',
+            'Картинка слишком большая: не больше 1 мегапикселей.'
+        )
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=100)
+    def test_large_upload_is_spooled_to_disk_and_saved(self):
+
+        response = self.create_post(self.png((300, 300)))
+
+        self.assertEqual(response.status_code, 302)
+        post = Post.objects.get()
+        self.assertTrue(post.image.name.startswith('posts/image'))
+        self.assertTrue(post.image.storage.exists(post.image.name))
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, WRITE_BEHIND=True)
+class WriteBehindTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user('Stas')
+        cls.post = Post.objects.create(text='Горячий пост', author=cls.user)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.user)
+        cache.clear()
+        self.addCleanup(ingest.writer.drain)
+
+    def comment(self, text):
+        return self.client.post(
+            reverse('posts:add_comment', args=[self.post.pk]),
+            data={'text': text},
+        )
+
+    def test_comments_are_written_in_one_batch(self):
+
+        self.comment('Первый')
+        self.comment('Второй')
+
+        self.assertFalse(Comment.objects.exists())
+        self.assertEqual(cache.get(ingest.pending_key(self.user.pk)), 2)
+        self.assertFalse(ingest.wait_for_own_writes(self.user.pk, 0))
+
+        with CaptureQueriesContext(connection) as queries:
+            ingest.writer.drain()
+
+        transactions = [
+            query for query in queries.captured_queries
+            if query['sql'].startswith('SAVEPOINT')
+        ]
+        self.assertEqual(len(transactions), 1)
+
+        self.assertEqual(
+            list(Comment.objects.values_list('text', flat=True)),
+            ['Первый', 'Второй'],
+        )
+        self.assertEqual(cache.get(ingest.pending_key(self.user.pk)), 0)
+        self.assertTrue(ingest.wait_for_own_writes(self.user.pk, 0))
+
+    @override_settings(WRITE_BEHIND_SYNC=False)
+    def test_in_memory_db_starts_no_writer_thread(self):
+
+        self.comment('Без потока')
+
+        self.assertIsNone(ingest.writer.thread)
+
+    def test_post_with_image_bypasses_queue(self):
+        buffer = BytesIO()
+        Image.new('RGB', (10, 10), 'white').save(buffer, 'PNG')
+
+        with patch.object(thumbnails, 'schedule'):
+            self.client.post(reverse('posts:post_create'), data={
+                'text': 'С картинкой',
+                'image': SimpleUploadedFile('image.png', buffer.getvalue()),
+            })
+            self.client.post(
+                reverse('posts:post_create'), data={'text': 'Без картинки'}
+            )
+
+        self.assertTrue(Post.objects.filter(text='С картинкой').exists())
+        self.assertFalse(Post.objects.filter(text='Без картинки').exists())
+        ingest.writer.drain()
+        self.assertTrue(Post.objects.filter(text='Без картинки').exists())
+
+    def test_broken_item_does_not_lose_batch(self):
+        self.comment('Хороший')
+        ingest.writer.put(
+            Comment(post=self.post, author=self.user, text=None),
+            self.user.pk,
+        )
+
+        with self.assertLogs(ingest.logger, 'ERROR'):
+            ingest.writer.drain()
+
+        self.assertEqual(
+            list(Comment.objects.values_list('text', flat=True)),
+            ['Хороший'],
+        )
+        self.assertEqual(cache.get(ingest.pending_key(self.user.pk)), 0)
+
+    def test_broken_item_does_not_lose_posts_of_batch(self):
+        self.client.post(
+            reverse('posts:post_create'), data={'text': 'Хороший пост'}
+        )
+        ingest.writer.put(Post(text='Без автора'), self.user.pk)
+
+        with self.assertLogs(ingest.logger, 'ERROR'):
+            ingest.writer.drain()
+
+        self.assertTrue(Post.objects.filter(text='Хороший пост').exists())
+        self.assertEqual(cache.get(ingest.pending_key(self.user.pk)), 0)
@@ -2,6 +2,7 @@ from django.contrib.auth import get_user_model
 from django.test import TestCase
 
 from ..models import Group, Post
+from ..paginators import NEXT, KeysetPaginator
 
 User = get_user_model()
 
@@ -59,3 +60,23 @@ class PostModelTest(TestCase):
                     self.long_post._meta.get_field(field).help_text,
                     expected_value
                 )
+
+    def test_feed_queries_use_composite_indexes(self):
+        paginator = KeysetPaginator(Post.objects.all(), 10)
+        page = paginator.page(NEXT, None)
+        cursor_values = paginator._key(page[0])
+        feeds = {
+            'post_group_pub_date_idx': Post.objects.filter(group=self.group),
+            'post_author_pub_date_idx': Post.objects.filter(author=self.user),
+        }
+        for index, queryset in feeds.items():
+            paginator = KeysetPaginator(queryset, 10)
+            for values in (None, cursor_values):
+                with self.subTest(index=index, cursor=values):
+                    plan = paginator._slice(
+                        queryset, paginator.ordering, values
+                    ).explain()
+                    self.assertIn(index, plan)
+                    self.assertNotIn('TEMP B-TREE', plan)
+                    if values is not None:
+                        self.assertIn('pub_date<?', plan)
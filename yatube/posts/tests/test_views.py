@@ -1,11 +1,34 @@
+import gzip
+import json
+import os
+import shutil
+import tempfile
 from http import HTTPStatus
+from io import StringIO
+from unittest.mock import patch
+
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
+from django.core.management import call_command
+from django.core.paginator import EmptyPage
+from django.db import connection
+from django.db.models import F
+from django.db.models.signals import post_delete
 from django.test import TestCase, Client
+from django.test.utils import CaptureQueriesContext
 from django import forms
 from django.urls import reverse
-
-from ..models import Group, Post, Comment, Follow
+from django.utils import timezone
+
+from .. import (
+    benchmarks, exports, follows, imports, ranking, search, timeline
+)
+from ..bulk import insert
+from ..models import (
+    Comment, Follow, Group, ImportCheckpoint, Post, TimelineEntry,
+    UserStats,
+)
+from ..paginators import KeysetPaginator
 
 User = get_user_model()
 
@@ -115,6 +138,61 @@ class PostViewTests(TestCase):
         self.assertEqual(len(response.context['page_obj']), self.needed_page)
         self.assertEqual(requested_context[1], expected_context[1])
 
+    def test_paginator_walks_pages_by_cursor(self):
+
+        first_page = self.author_client.get(reverse('posts:index'))
+        page_obj = first_page.context['page_obj']
+        self.assertFalse(page_obj.has_previous())
+        self.assertTrue(page_obj.has_next())
+
+        second_page = self.author_client.get(
+            reverse('posts:index'), {'cursor': page_obj.next_cursor}
+        )
+        second_page_obj = second_page.context['page_obj']
+        self.assertEqual(
+            list(second_page_obj),
+            list(Post.objects.order_by('-pub_date', '-id')[10:])
+        )
+        self.assertFalse(second_page_obj.has_next())
+
+        back_page = self.author_client.get(
+            reverse('posts:index'),
+            {'cursor': second_page_obj.previous_cursor}
+        )
+        self.assertEqual(
+            list(back_page.context['page_obj']), list(page_obj)
+        )
+        self.assertFalse(back_page.context['page_obj'].has_previous())
+
+    def test_paginator_ignores_broken_cursor_and_skips_count(self):
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.guest_client.get(
+                reverse('posts:group_list', kwargs={'slug': 'group'}),
+                {'cursor': 'broken'}
+            )
+        self.assertEqual(len(response.context['page_obj']), self.needed_page)
+        for query in queries.captured_queries:
+            self.assertNotIn('COUNT(', query['sql'])
+            self.assertNotIn('OFFSET', query['sql'])
+
+    def test_keyset_page_has_cursors_instead_of_numbers(self):
+        page_obj = KeysetPaginator(
+            Post.objects.all(), self.needed_page
+        ).get_page(None)
+
+        self.assertEqual(page_obj.next_page_number(), page_obj.next_cursor)
+        with self.assertRaises(EmptyPage):
+            page_obj.previous_page_number()
+        for number in ('start_index', 'end_index'):
+            with self.subTest(method=number):
+                with self.assertRaisesMessage(AttributeError, 'курсорами'):
+                    getattr(page_obj, number)()
+        for number in ('count', 'num_pages', 'page_range'):
+            with self.subTest(attribute=number):
+                with self.assertRaisesMessage(AttributeError, 'курсорами'):
+                    getattr(page_obj.paginator, number)
+
     def test_post_detail_page_show_1_post_equal_post_id(self):
 
         response = self.author_client.get(
@@ -164,24 +242,46 @@ class PostViewTests(TestCase):
 
     def test_cache_index_correct(self):
 
-        resp_before_created_post = self.authorized_client.get('/')
+        resp_before_changes = self.authorized_client.get('/')
+        Post.objects.filter(pk=self.post_id).update(text='Мимо сигналов')
+        resp_after_silent_update = self.authorized_client.get('/')
+
+        self.assertEqual(
+            resp_before_changes.content,
+            resp_after_silent_update.content,
+        )
+
         Post.objects.create(
             text='Проверка кэша',
             author=self.autorized_user
         )
         resp_after_created_post = self.authorized_client.get('/')
 
-        self.assertEqual(
-            resp_before_created_post.content,
+        self.assertNotEqual(
+            resp_after_silent_update.content,
             resp_after_created_post.content,
         )
+        self.assertContains(resp_after_created_post, 'Проверка кэша')
 
-        cache.clear()
-        resp_after_clear_cache = self.authorized_client.get('/')
+    def test_group_page_cache_is_reset_only_by_its_group(self):
 
-        self.assertNotEqual(
-            resp_after_created_post.content,
-            resp_after_clear_cache.content,
+        group_url = reverse('posts:group_list', kwargs={'slug': 'group2'})
+        self.guest_client.get(group_url)
+        Post.objects.create(
+            text='Пост другой группы',
+            author=self.author_user,
+            group=self.group,
+        )
+        with self.assertNumQueries(0):
+            self.guest_client.get(group_url)
+
+        Post.objects.create(
+            text='Пост второй группы',
+            author=self.author_user,
+            group=self.group2,
+        )
+        self.assertContains(
+            self.guest_client.get(group_url), 'Пост второй группы'
         )
 
 
@@ -345,3 +445,1272 @@ class FollowViewTests(TestCase):
             'Пост виден только подписчикам',
             response.context['page_obj']
         )
+
+    def test_unsubscribed_user_loses_author_posts_from_feed(self):
+
+        Follow.objects.create(user=self.subscriber, author=self.author)
+        post = Post.objects.create(text='Пост из ленты', author=self.author)
+        self.assertTrue(
+            TimelineEntry.objects.filter(
+                user=self.subscriber, post=post
+            ).exists()
+        )
+
+        Follow.objects.filter(
+            user=self.subscriber, author=self.author
+        ).delete()
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+
+        self.assertNotIn(post, response.context['page_obj'])
+        self.assertFalse(self.subscriber.timeline.exists())
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user('Author')
+        cls.star = User.objects.create_user('Star')
+        cls.subscriber = User.objects.create_user('subscriber')
+        Follow.objects.create(user=cls.subscriber, author=cls.author)
+        Follow.objects.create(user=cls.subscriber, author=cls.star)
+        Follow.objects.create(
+            user=User.objects.create_user('fan'), author=cls.star
+        )
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.subscriber)
+        cache.clear()
+
+    def test_celebrity_posts_are_merged_into_feed_on_read(self):
+
+        with patch.object(timeline, 'FANOUT_LIMIT', 1):
+            cache.clear()
+            star_post = Post.objects.create(text='Звезда', author=self.star)
+            author_post = Post.objects.create(text='Автор', author=self.author)
+            response = self.client.get(reverse('posts:follow_index'))
+
+        self.assertFalse(
+            TimelineEntry.objects.filter(post=star_post).exists()
+        )
+        self.assertTrue(
+            TimelineEntry.objects.filter(post=author_post).exists()
+        )
+        self.assertEqual(
+            list(response.context['page_obj']), [author_post, star_post]
+        )
+
+    def test_rebuild_timeline_command_restores_feed(self):
+
+        post = Post.objects.create(text='Пост', author=self.author)
+        TimelineEntry.objects.all().delete()
+
+        call_command('rebuild_timeline', stdout=StringIO())
+
+        self.assertTrue(
+            TimelineEntry.objects.filter(
+                user=self.subscriber, post=post
+            ).exists()
+        )
+
+    def test_failed_rebuild_keeps_old_feed(self):
+        post = Post.objects.create(text='Пост', author=self.author)
+
+        with patch.object(
+            timeline, 'subscribe_many', side_effect=RuntimeError
+        ):
+            with self.assertRaises(RuntimeError):
+                timeline.rebuild(self.subscriber)
+
+        self.assertTrue(
+            TimelineEntry.objects.filter(
+                user=self.subscriber, post=post
+            ).exists()
+        )
+
+
+class CountersTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user('Author')
+        cls.reader = User.objects.create_user('reader')
+        cls.post = Post.objects.create(text='Пост', author=cls.author)
+
+    def setUp(self):
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        cache.clear()
+
+    def test_counters_follow_writes(self):
+
+        self.reader_client.get(
+            reverse('posts:profile_follow', kwargs={'username': 'Author'})
+        )
+        Comment.objects.create(post=self.post, author=self.reader, text='1')
+        Post.objects.create(text='Второй пост', author=self.author)
+
+        response = self.reader_client.get(
+            reverse('posts:profile', kwargs={'username': 'Author'})
+        )
+        self.assertEqual(response.context['count_post'], 2)
+        self.assertEqual(response.context['count_follower'], 1)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
+
+        self.reader_client.get(
+            reverse('posts:profile_unfollow', kwargs={'username': 'Author'})
+        )
+        self.post.comments.all().delete()
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).followers_count, 0
+        )
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 0)
+
+    def test_profile_reads_counters_without_aggregates(self):
+
+        with CaptureQueriesContext(connection) as queries:
+            self.reader_client.get(
+                reverse('posts:profile', kwargs={'username': 'Author'})
+            )
+        for query in queries.captured_queries:
+            self.assertNotIn('COUNT(', query['sql'])
+
+    def test_reconcile_counters_repairs_drift(self):
+
+        UserStats.objects.filter(user=self.author).update(posts_count=42)
+        Post.objects.filter(pk=self.post.pk).update(comments_count=5)
+
+        call_command('reconcile_counters', stdout=StringIO())
+
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).posts_count, 1
+        )
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 0)
+
+    def test_reconcile_counts_posts_and_followers_separately(self):
+        Post.objects.create(text='Второй пост', author=self.author)
+        for name in ('first', 'second'):
+            Follow.objects.create(
+                user=User.objects.create_user(name), author=self.author
+            )
+        UserStats.objects.all().delete()
+
+        with CaptureQueriesContext(connection) as queries:
+            call_command('reconcile_counters', stdout=StringIO())
+
+        stats = UserStats.objects.get(user=self.author)
+        self.assertEqual((stats.posts_count, stats.followers_count), (2, 2))
+        counts = next(
+            query['sql'] for query in queries.captured_queries
+            if query['sql'].startswith('SELECT "auth_user"."id"')
+        )
+        self.assertNotIn('JOIN', counts)
+
+
+class PostCardCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user('Author')
+        cls.group = Group.objects.create(
+            title='Group', slug='group', description='Описание'
+        )
+        cls.post = Post.objects.create(text='Старый текст', author=cls.author)
+
+    def setUp(self):
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.profile_url = reverse(
+            'posts:profile', kwargs={'username': 'Author'}
+        )
+        cache.clear()
+
+    def test_cached_card_is_reused_between_listings(self):
+
+        self.author_client.get(self.profile_url)
+        Post.objects.filter(pk=self.post.pk).update(text='Текст мимо save')
+
+        response = self.author_client.get(self.profile_url)
+
+        self.assertContains(response, 'Старый текст')
+
+    def test_post_edit_bumps_card_version(self):
+
+        self.author_client.get(self.profile_url)
+        self.author_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': self.post.pk}),
+            data={'text': 'Новый текст', 'group': self.group.pk},
+        )
+
+        response = self.author_client.get(self.profile_url)
+
+        self.assertContains(response, 'Новый текст')
+        self.assertContains(
+            response, reverse('posts:group_list', kwargs={'slug': 'group'})
+        )
+
+    def test_post_created_with_explicit_id_starts_at_first_version(self):
+
+        post = Post.objects.create(
+            id=self.post.pk + 100, text='С id', author=self.post.author
+        )
+
+        self.assertEqual(post.version, Post().version)
+
+    def test_group_slug_change_bumps_card_version(self):
+
+        Post.objects.filter(pk=self.post.pk).update(group=self.group)
+        self.author_client.get(self.profile_url)
+        self.group.slug = 'renamed'
+        self.group.save()
+
+        response = self.author_client.get(self.profile_url)
+
+        self.assertContains(
+            response, reverse('posts:group_list', kwargs={'slug': 'renamed'})
+        )
+
+
+class ListingQueryBudgetTests(TestCase):
+    # Запросов на страницу ленты с холодным кэшем: сессия, пользователь,
+    # сама лента и служебные (автор, счётчики, подписка). Число не должно
+    # зависеть от количества постов на странице.
+    QUERY_BUDGET = 6
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user('reader')
+        cls.group = Group.objects.create(
+            title='Group', slug='group', description='Описание'
+        )
+        for number in range(10):
+            author = User.objects.create_user(f'author{number}')
+            group = Group.objects.create(
+                title=f'Group{number}', slug=f'group{number}',
+                description='Описание',
+            )
+            Follow.objects.create(user=cls.reader, author=author)
+            Post.objects.create(text='Пост', author=author, group=group)
+            Post.objects.create(
+                text='Пост группы', author=author, group=cls.group
+            )
+
+    def setUp(self):
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_listing_pages_fit_query_budget(self):
+
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'group'}),
+            reverse('posts:profile', kwargs={'username': 'author0'}),
+            reverse('posts:follow_index'),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                cache.clear()
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.reader_client.get(url)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                self.assertLessEqual(
+                    len(queries), self.QUERY_BUDGET,
+                    '\n'.join(query['sql'] for query in queries)
+                )
+
+
+class CommentPagingTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user('Author')
+        cls.post = Post.objects.create(text='Пост', author=cls.author)
+        for number in range(25):
+            Comment.objects.create(
+                post=cls.post,
+                author=User.objects.create_user(f'reader{number}'),
+                text=f'Комментарий {number}',
+            )
+
+    def setUp(self):
+        self.guest_client = Client()
+        self.detail_url = reverse(
+            'posts:post_detail', kwargs={'post_id': self.post.pk}
+        )
+        self.comments_url = reverse(
+            'posts:post_comments', kwargs={'post_id': self.post.pk}
+        )
+        cache.clear()
+
+    def test_post_detail_shows_first_comments_page(self):
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.guest_client.get(self.detail_url)
+
+        comments = response.context['comments']
+        self.assertEqual(
+            [comment.text for comment in comments],
+            [f'Комментарий {number}' for number in range(20)]
+        )
+        self.assertTrue(comments.has_next())
+        self.assertContains(response, f'?cursor={comments.next_cursor}')
+        self.assertLess(len(queries), 10)
+
+    def test_load_more_returns_next_slice_as_fragment(self):
+
+        cursor = self.guest_client.get(
+            self.detail_url
+        ).context['comments'].next_cursor
+
+        response = self.guest_client.get(self.comments_url, {'cursor': cursor})
+
+        self.assertTemplateUsed(response, 'posts/includes/comments.html')
+        self.assertTemplateNotUsed(response, 'base.html')
+        self.assertContains(response, 'Комментарий 24')
+        self.assertContains(response, 'media-body', count=5)
+        self.assertNotContains(response, 'Показать ещё')
+
+    def test_load_more_as_json(self):
+
+        response = self.guest_client.get(
+            self.comments_url, {'format': 'json'}
+        )
+
+        data = response.json()
+        self.assertEqual(len(data['comments']), 20)
+        self.assertEqual(data['comments'][0]['author'], 'reader0')
+        next_page = self.guest_client.get(
+            self.comments_url,
+            {'format': 'json', 'cursor': data['next_cursor']}
+        ).json()
+        self.assertEqual(
+            [comment['text'] for comment in next_page['comments']],
+            [f'Комментарий {number}' for number in range(20, 25)]
+        )
+        self.assertIsNone(next_page['next_cursor'])
+
+    def test_comments_of_missing_post_is_404(self):
+
+        response = self.guest_client.get(
+            reverse('posts:post_comments', kwargs={'post_id': 999})
+        )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user('Author')
+        cls.post = Post.objects.create(
+            text='Первые посты о <b>котах</b>', author=cls.author
+        )
+        cls.other = Post.objects.create(
+            text='Про собак', author=cls.author
+        )
+
+    def setUp(self):
+        self.guest_client = Client()
+        self.url = reverse('posts:search')
+        self.post.refresh_from_db()
+        self.other = Post.objects.get(text='Про собак')
+
+    def found(self, query):
+        response = self.guest_client.get(self.url, {'q': query})
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        return [post for post, snippet in response.context['results']]
+
+    def test_search_finds_by_word_prefix_and_highlights(self):
+
+        response = self.guest_client.get(self.url, {'q': 'пост кот'})
+
+        post, snippet = response.context['results'][0]
+        self.assertEqual(post, self.post)
+        self.assertEqual(len(response.context['results']), 1)
+        self.assertIn('<mark>посты</mark>', snippet)
+        self.assertIn('&lt;b&gt;<mark>котах</mark>', snippet)
+
+    def test_index_follows_post_and_comment_changes(self):
+
+        self.other.text = 'Про енотов'
+        self.other.save()
+        Comment.objects.create(
+            post=self.post, author=self.author, text='Мурлыкают'
+        )
+
+        self.assertEqual(self.found('собак'), [])
+        self.assertEqual(self.found('енот'), [self.other])
+        self.assertEqual(self.found('мурлык'), [self.post])
+
+        self.post.comments.all().delete()
+        self.other.delete()
+
+        self.assertEqual(self.found('мурлык'), [])
+        self.assertEqual(self.found('енот'), [])
+
+    def test_comment_write_indexes_only_that_comment(self):
+        for number in range(3):
+            Comment.objects.create(
+                post=self.post, author=self.author, text=f'Старый {number}'
+            )
+
+        with CaptureQueriesContext(connection) as queries:
+            comment = Comment.objects.create(
+                post=self.post, author=self.author, text='Мяукают'
+            )
+        indexing = [
+            query['sql'] for query in queries.captured_queries
+            if search.COMMENTS_TABLE in query['sql']
+            or search.TABLE in query['sql']
+        ]
+
+        self.assertEqual(len(indexing), 2)
+        for sql in indexing:
+            self.assertIn(search.COMMENTS_TABLE, sql)
+            self.assertIn(str(comment.pk), sql)
+        self.assertEqual(self.found('мяука'), [self.post])
+        self.assertEqual(self.found('старый'), [self.post])
+
+    def test_ranking_prefers_post_text(self):
+
+        Comment.objects.create(
+            post=self.other, author=self.author, text='Коты лучше'
+        )
+
+        self.assertEqual(self.found('кот'), [self.post, self.other])
+
+    def test_query_syntax_is_not_interpreted(self):
+
+        for query in ('"', 'кот OR', 'NEAR(', '*', '-кот'):
+            with self.subTest(query=query):
+                self.found(query)
+
+    def test_like_fallback_without_index(self):
+
+        with patch('posts.search.enabled', return_value=False):
+            response = self.guest_client.get(self.url, {'q': 'кот'})
+
+        post, snippet = response.context['results'][0]
+        self.assertEqual(post, self.post)
+        self.assertIn('<mark>кот</mark>ах', snippet)
+
+    def test_postgres_uses_full_text_search(self):
+        found = [(self.post.pk, 'о \x02котах\x03')]
+
+        with patch('posts.search.connection') as connection, patch(
+            'posts.search._search_postgres', return_value=found
+        ) as search_postgres:
+            connection.vendor = 'postgresql'
+            results = search.search('кот')
+
+        search_postgres.assert_called_once_with(['кот'], search.SEARCH_LIMIT)
+        self.assertEqual(results[0][0], self.post)
+        self.assertIn('<mark>котах</mark>', results[0][1])
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user('Author')
+        cls.reader = User.objects.create_user('reader')
+        cls.group = Group.objects.create(
+            title='Group', slug='group', description='Описание'
+        )
+        cls.post = Post.objects.create(
+            text='Пост', author=cls.author, group=cls.group
+        )
+
+    def setUp(self):
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        cache.clear()
+
+    def revalidate(self, url, etag):
+        return self.reader_client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_feeds_return_compact_json(self):
+
+        urls = (
+            reverse('posts:api_index'),
+            reverse('posts:api_group_list', kwargs={'slug': 'group'}),
+            reverse('posts:api_profile', kwargs={'username': 'Author'}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.reader_client.get(url)
+                data = response.json()
+                self.assertEqual(data['results'][0]['id'], self.post.pk)
+                self.assertEqual(data['results'][0]['group'], 'group')
+                self.assertIsNone(data['next'])
+                self.assertTrue(response['ETag'].startswith('"'))
+                self.assertIn('no-cache', response['Cache-Control'])
+
+        detail = self.reader_client.get(
+            reverse('posts:api_post_detail', args=[self.post.pk])
+        ).json()
+        self.assertEqual(detail['author']['username'], 'Author')
+        self.assertEqual(detail['comments_count'], 0)
+
+    def test_not_modified_skips_serialization(self):
+
+        url = reverse('posts:api_profile', kwargs={'username': 'Author'})
+        etag = self.reader_client.get(url)['ETag']
+
+        with patch('posts.api.serialize_post') as serialize_post:
+            response = self.revalidate(url, etag)
+
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+        serialize_post.assert_not_called()
+
+    def test_etag_ignores_writes_outside_payload(self):
+
+        url = reverse('posts:api_group_list', kwargs={'slug': 'group'})
+        etag = self.reader_client.get(url)['ETag']
+
+        Post.objects.create(text='Без группы', author=self.author)
+        self.assertEqual(
+            self.revalidate(url, etag).status_code, HTTPStatus.NOT_MODIFIED
+        )
+
+        Post.objects.filter(pk=self.post.pk).update(version=F('version') + 1)
+        self.assertEqual(self.revalidate(url, etag).status_code, HTTPStatus.OK)
+
+    def test_writes_change_etag(self):
+
+        index_url = reverse('posts:api_index')
+        detail_url = reverse('posts:api_post_detail', args=[self.post.pk])
+        index_etag = self.reader_client.get(index_url)['ETag']
+        detail_etag = self.reader_client.get(detail_url)['ETag']
+
+        Comment.objects.create(post=self.post, author=self.reader, text='1')
+        self.assertEqual(
+            self.revalidate(index_url, index_etag).status_code,
+            HTTPStatus.NOT_MODIFIED
+        )
+        response = self.revalidate(detail_url, detail_etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response.json()['comments_count'], 1)
+
+        Post.objects.create(text='Новый', author=self.author)
+        self.assertEqual(
+            self.revalidate(index_url, index_etag).status_code,
+            HTTPStatus.OK
+        )
+
+    def test_follow_feed_etag_tracks_subscriptions(self):
+
+        url = reverse('posts:api_follow_index')
+        self.assertEqual(Client().get(url).status_code, 401)
+        response = self.reader_client.get(url)
+        self.assertEqual(response.json()['results'], [])
+
+        Follow.objects.create(user=self.reader, author=self.author)
+
+        response = self.revalidate(url, response['ETag'])
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(
+            [post['id'] for post in response.json()['results']],
+            [self.post.pk]
+        )
+        self.assertIn('Cookie', response['Vary'])
+
+
+class HttpCachingTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user('Author')
+        cls.group = Group.objects.create(
+            title='Group', slug='group', description='Описание'
+        )
+        cls.post = Post.objects.create(
+            text='Пост', author=cls.author, group=cls.group
+        )
+
+    def setUp(self):
+        self.guest_client = Client()
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'group'}),
+            reverse('posts:profile', kwargs={'username': 'Author'}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+        )
+        cache.clear()
+
+    def test_anonymous_pages_are_cacheable_on_the_edge(self):
+
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertTrue(response.has_header('ETag'))
+                self.assertTrue(response.has_header('Last-Modified'))
+                self.assertFalse(response.has_header('Expires'))
+                self.assertIn('Cookie', response['Vary'])
+                control = response['Cache-Control']
+                self.assertIn('public', control)
+                self.assertIn('s-maxage=60', control)
+                self.assertIn('max-age=0', control)
+
+                self.assertEqual(
+                    self.guest_client.get(
+                        url, HTTP_IF_NONE_MATCH=response['ETag']
+                    ).status_code,
+                    HTTPStatus.NOT_MODIFIED
+                )
+                self.assertEqual(
+                    self.guest_client.get(
+                        url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+                    ).status_code,
+                    HTTPStatus.NOT_MODIFIED
+                )
+
+    def test_user_pages_are_private_and_have_own_etag(self):
+
+        url = self.urls[0]
+        guest = self.guest_client.get(url)
+        author = self.author_client.get(url)
+
+        self.assertIn('private', author['Cache-Control'])
+        self.assertNotIn('public', author['Cache-Control'])
+        self.assertNotEqual(guest['ETag'], author['ETag'])
+        self.assertEqual(
+            self.author_client.get(
+                url, HTTP_IF_NONE_MATCH=guest['ETag']
+            ).status_code,
+            HTTPStatus.OK
+        )
+
+    def test_new_comment_refreshes_post_detail(self):
+
+        url = self.urls[3]
+        etag = self.guest_client.get(url)['ETag']
+
+        Comment.objects.create(post=self.post, author=self.author, text='1')
+
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_new_post_of_author_refreshes_post_detail(self):
+
+        url = self.urls[3]
+        etag = self.guest_client.get(url)['ETag']
+
+        Post.objects.create(text='Ещё пост', author=self.author)
+
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertContains(response, '<span >2</span>', html=False)
+
+
+class HolePunchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user('Author')
+        cls.reader = User.objects.create_user('reader')
+        cls.post = Post.objects.create(text='Пост', author=cls.author)
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        self.profile_url = reverse(
+            'posts:profile', kwargs={'username': 'Author'}
+        )
+        self.detail_url = reverse(
+            'posts:post_detail', kwargs={'post_id': self.post.pk}
+        )
+        cache.clear()
+
+    def test_users_share_anonymous_page_with_own_fragments(self):
+
+        Client().get(self.profile_url)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.reader_client.get(self.profile_url)
+
+        for query in queries.captured_queries:
+            self.assertNotIn('"posts_post"', query['sql'])
+        self.assertContains(response, 'Пользователь: reader')
+        self.assertContains(response, 'Отписаться')
+        self.assertNotContains(response, '<!--hole:')
+
+        response = self.author_client.get(self.profile_url)
+        self.assertContains(response, 'Пользователь: Author')
+        self.assertContains(response, 'Подписаться')
+
+    def test_second_user_does_not_get_first_users_profile(self):
+
+        reader = self.reader_client.get(self.profile_url)
+        author = self.author_client.get(self.profile_url)
+
+        self.assertContains(reader, 'Пользователь: reader')
+        self.assertContains(reader, 'Отписаться')
+        self.assertContains(author, 'Пользователь: Author')
+        self.assertNotContains(author, 'reader')
+        self.assertNotContains(author, 'Отписаться')
+
+    def test_post_detail_fragments(self):
+
+        anonymous = Client().get(self.detail_url)
+        self.assertNotContains(anonymous, 'Добавить комментарий')
+        self.assertNotContains(anonymous, 'редактировать запись')
+
+        reader = self.reader_client.get(self.detail_url)
+        self.assertContains(reader, 'Добавить комментарий')
+        self.assertContains(reader, 'csrfmiddlewaretoken')
+        self.assertNotContains(reader, 'редактировать запись')
+
+        self.assertContains(
+            self.author_client.get(self.detail_url), 'редактировать запись'
+        )
+
+    def test_author_posts_count_is_fresh_on_cached_page(self):
+
+        self.reader_client.get(self.detail_url)
+        Post.objects.create(text='Второй', author=self.author)
+
+        response = self.reader_client.get(self.detail_url)
+
+        self.assertContains(response, '<span >2</span>')
+
+
+class BulkFollowTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user('reader')
+        cls.authors = [
+            User.objects.create_user(f'author{number}') for number in range(5)
+        ]
+        for author in cls.authors:
+            Post.objects.create(text=f'Пост {author}', author=author)
+        Follow.objects.create(user=cls.reader, author=cls.authors[0])
+
+    def setUp(self):
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        self.url = reverse('posts:api_follow_bulk')
+
+    def post(self, client, data):
+        return client.post(
+            self.url, json.dumps(data), content_type='application/json'
+        )
+
+    def test_follow_many_reports_each_name(self):
+
+        names = ['author0', 'author1', 'author2', 'ghost', 'reader']
+        results = follows.follow_many(self.reader, names)
+
+        self.assertEqual(results, {
+            'author0': follows.ALREADY_FOLLOWING,
+            'author1': follows.FOLLOWED,
+            'author2': follows.FOLLOWED,
+            'ghost': follows.NOT_FOUND,
+            'reader': follows.SELF,
+        })
+        self.assertEqual(
+            set(Follow.objects.filter(user=self.reader).values_list(
+                'author__username', flat=True
+            )),
+            {'author0', 'author1', 'author2'}
+        )
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 3
+        )
+        for author in self.authors[:3]:
+            self.assertEqual(
+                UserStats.objects.get(user=author).followers_count, 1
+            )
+
+    def test_subscribe_many_inserts_in_database_per_batch(self):
+        for author in self.authors:
+            for number in range(3):
+                Post.objects.create(text=f'Ещё {number}', author=author)
+        TimelineEntry.objects.filter(user=self.reader).delete()
+        author_ids = [author.pk for author in self.authors]
+
+        with patch.object(timeline, 'BACKFILL_LIMIT', 2), \
+                patch.object(timeline, 'AUTHORS_BATCH', 2), \
+                CaptureQueriesContext(connection) as queries:
+            timeline.subscribe_many(self.reader.pk, author_ids)
+
+        inserts = [
+            query['sql'] for query in queries.captured_queries
+            if query['sql'].startswith('INSERT')
+        ]
+        self.assertEqual(len(inserts), 3)
+        entries = TimelineEntry.objects.filter(user=self.reader)
+        for author in self.authors:
+            self.assertEqual(
+                list(entries.filter(post__author=author).values_list(
+                    'post__text', flat=True
+                ).order_by('-pub_date', '-post_id')),
+                ['Ещё 2', 'Ещё 1'],
+            )
+
+    def test_unfollow_many_updates_in_batch(self):
+
+        follows.follow_many(self.reader, ['author1', 'author2'])
+
+        deleted = []
+        post_delete.connect(
+            lambda **kwargs: deleted.append(kwargs['instance']),
+            sender=Follow, weak=False, dispatch_uid='bulk_follow_test',
+        )
+        try:
+            results = follows.unfollow_many(
+                self.reader, ['author0', 'author1', 'author3']
+            )
+        finally:
+            post_delete.disconnect(dispatch_uid='bulk_follow_test')
+
+        self.assertEqual(deleted, [])
+        self.assertEqual(results, {
+            'author0': follows.UNFOLLOWED,
+            'author1': follows.UNFOLLOWED,
+            'author3': follows.NOT_FOLLOWING,
+        })
+        self.assertEqual(
+            list(TimelineEntry.objects.filter(user=self.reader).values_list(
+                'post__author__username', flat=True
+            )),
+            ['author2']
+        )
+        self.assertEqual(
+            UserStats.objects.get(user=self.authors[0]).followers_count, 0
+        )
+
+    def test_bulk_endpoint(self):
+
+        self.assertEqual(
+            self.post(Client(), {'usernames': ['author1']}).status_code, 401
+        )
+        for body in ({}, {'usernames': 'author1'}, [],
+                     {'usernames': ['author1'], 'action': 'block'}):
+            with self.subTest(body=body):
+                self.assertEqual(
+                    self.post(self.reader_client, body).status_code, 400
+                )
+
+        response = self.post(
+            self.reader_client,
+            {'action': 'follow', 'usernames': ['author1', 'ghost']}
+        )
+
+        self.assertEqual(response.json()['results'], {
+            'author1': 'followed', 'ghost': 'not_found'
+        })
+
+
+class BenchmarkTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        benchmarks.seed(
+            users=20, posts=60, comments=30, groups=2, follows_per_user=3,
+            log=lambda message: None,
+        )
+
+    def test_insert_keeps_dates_without_touching_the_field(self):
+        author = User.objects.first()
+        old = timezone.now() - timezone.timedelta(days=3)
+
+        insert([Post(text='Из выгрузки', author=author, pub_date=old)])
+        Post.objects.create(text='Новый', author=author, pub_date=old)
+
+        self.assertEqual(Post.objects.get(text='Из выгрузки').pub_date, old)
+        self.assertGreater(Post.objects.get(text='Новый').pub_date, old)
+        self.assertTrue(Post._meta.get_field('pub_date').auto_now_add)
+
+    def test_seed_builds_derived_tables(self):
+
+        self.assertEqual(User.objects.count(), 20)
+        self.assertEqual(Post.objects.count(), 60)
+        self.assertEqual(Comment.objects.count(), 30)
+        self.assertGreater(
+            len(set(Post.objects.values_list('pub_date', flat=True))), 1
+        )
+        follow = Follow.objects.first()
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=follow.user).count(),
+            Post.objects.filter(
+                author__following__user=follow.user
+            ).count(),
+        )
+        stats = UserStats.objects.get(user=follow.author)
+        self.assertEqual(
+            stats.followers_count, follow.author.following.count()
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT COUNT(*) FROM {search.TABLE}')
+            self.assertEqual(cursor.fetchone()[0], 60)
+
+    def test_run_measures_every_scenario(self):
+
+        results = benchmarks.run(iterations=2, warmup=0)
+
+        self.assertEqual(set(results), {
+            'index', 'group_posts', 'profile', 'post_detail',
+            'follow_index', 'post_create', 'add_comment',
+        })
+        for result in results.values():
+            self.assertLessEqual(result['p50'], result['p99'])
+
+    def test_compare_reports_slower_and_chattier_views(self):
+        baseline = {'index': {'p95': 10.0, 'queries': 2}}
+
+        self.assertEqual(benchmarks.compare(
+            {'index': {'p95': 11.0, 'queries': 2}}, baseline
+        ), [])
+        self.assertEqual(len(benchmarks.compare(
+            {'index': {'p95': 13.0, 'queries': 3}}, baseline
+        )), 2)
+
+
+class ImportTests(TestCase):
+    RECORDS = [
+        {'type': 'user', 'username': 'reader'},
+        {'type': 'user', 'username': 'writer', 'first_name': 'Лев'},
+        {'type': 'group', 'slug': 'prose', 'title': 'Проза'},
+        {'type': 'post', 'id': 50, 'author': 'writer', 'group': 'prose',
+         'text': 'Импортный пост', 'pub_date': '2020-01-02T03:04:05'},
+        {'type': 'post', 'author': 'nobody', 'text': 'Без автора'},
+        {'type': 'follow', 'user': 'reader', 'author': 'writer'},
+        {'type': 'comment', 'post': 50, 'author': 'reader', 'text': 'Раз'},
+        {'type': 'comment', 'post': 50, 'author': 'reader', 'text': 'Два'},
+        {'type': 'comment', 'post': 50, 'author': 'writer', 'text': 'Три'},
+        {'type': 'comment', 'post': 404, 'author': 'reader', 'text': 'Нет'},
+    ]
+
+    def setUp(self):
+        cache.clear()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def write(self, name, lines):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as target:
+            target.write('\n'.join(lines) + '\n')
+        return path
+
+    def jsonl(self):
+        return self.write('data.jsonl', [
+            json.dumps(record, ensure_ascii=False) for record in self.RECORDS
+        ])
+
+    def test_jsonl_import_resolves_references(self):
+
+        call_command('import_yatube', self.jsonl(), stdout=StringIO())
+
+        post = Post.objects.get()
+        self.assertEqual(post.pk, 50)
+        self.assertEqual(post.author.first_name, 'Лев')
+        self.assertEqual(post.group.slug, 'prose')
+        self.assertEqual(post.pub_date.year, 2020)
+        self.assertEqual(post.comments_count, 3)
+        self.assertEqual(post.author.stats.posts_count, 1)
+        self.assertTrue(
+            TimelineEntry.objects.filter(
+                user__username='reader', post=post
+            ).exists()
+        )
+
+    def test_csv_type_is_taken_from_file_name(self):
+        User.objects.create_user('writer')
+        path = self.write('posts.csv', [
+            'id,author,text', '7,writer,Из CSV', '8,ghost,Пропущен',
+        ])
+
+        out = StringIO()
+        call_command('import_yatube', path, stdout=out)
+
+        self.assertEqual(
+            list(Post.objects.values_list('pk', 'text')), [(7, 'Из CSV')]
+        )
+        self.assertIn('post: пропущено: 1', out.getvalue())
+
+    def test_post_with_taken_id_is_skipped_with_its_comments(self):
+        other = User.objects.create_user('other')
+        Post.objects.create(id=50, text='Чужой пост', author=other)
+
+        out = StringIO()
+        call_command('import_yatube', self.jsonl(), stdout=out)
+
+        post = Post.objects.get()
+        self.assertEqual(post.text, 'Чужой пост')
+        self.assertFalse(Comment.objects.exists())
+        self.assertIn('post: загружено: 0', out.getvalue())
+        self.assertIn('post: пропущено: 2', out.getvalue())
+        self.assertIn('comment: пропущено: 4', out.getvalue())
+
+    def test_comments_file_refers_to_posts_of_loaded_file(self):
+        User.objects.create_user('writer')
+        posts = self.write('posts.csv', ['id,author,text', '7,writer,Пост'])
+        comments = self.write(
+            'comments.csv', ['post,author,text', '7,writer,Комментарий']
+        )
+        call_command('import_yatube', posts, stdout=StringIO())
+
+        call_command('import_yatube', posts, comments, stdout=StringIO())
+
+        self.assertEqual(Comment.objects.get().post_id, 7)
+
+    def test_interrupted_import_resumes_from_checkpoint(self):
+        path = self.jsonl()
+        flush = imports.Importer.flush
+        calls = []
+
+        def crash_on_third_chunk(importer):
+            calls.append(importer)
+            if len(calls) == 3:
+                raise RuntimeError('Упали посреди импорта')
+            flush(importer)
+
+        with patch.object(imports.Importer, 'flush', crash_on_third_chunk):
+            with self.assertRaises(RuntimeError):
+                call_command(
+                    'import_yatube', path, chunk_size=4, stdout=StringIO()
+                )
+        self.assertEqual(ImportCheckpoint.objects.get().position, 8)
+        self.assertEqual(Comment.objects.count(), 2)
+
+        call_command('import_yatube', path, chunk_size=4, stdout=StringIO())
+        out = StringIO()
+        call_command('import_yatube', path, stdout=out)
+
+        self.assertEqual(Comment.objects.count(), 3)
+        self.assertIn('уже загружен', out.getvalue())
+
+
+class ExportTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('reader', first_name='Анна')
+        self.author = User.objects.create_user(
+            'writer', email='writer@example.com', last_name='Толстой'
+        )
+        self.group = Group.objects.create(
+            title='Проза', slug='prose', description='Описание'
+        )
+        self.post = Post.objects.create(
+            text='Пост автора', author=self.author, group=self.group
+        )
+        self.own_post = Post.objects.create(text='Свой', author=self.user)
+        Comment.objects.create(
+            post=self.post, author=self.user, text='Комментарий'
+        )
+        Comment.objects.create(
+            post=self.own_post, author=self.user, text='К своему'
+        )
+        Follow.objects.create(user=self.user, author=self.author)
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    @staticmethod
+    def parse(chunks):
+        return [
+            json.loads(line)
+            for line in gzip.decompress(b''.join(chunks)).splitlines()
+        ]
+
+    def test_user_export_streams_own_data(self):
+
+        with self.assertNumQueries(0):
+            response = exports.export(self.user)
+        records = self.parse(response)
+
+        self.assertEqual(
+            [(record['type'], record.get('text')) for record in records],
+            [
+                ('user', None), ('user', None), ('post', 'Свой'),
+                ('comment', 'К своему'), ('follow', None),
+            ],
+        )
+        self.assertEqual(records[0]['first_name'], 'Анна')
+        self.assertNotIn('password', records[0])
+        self.assertEqual(records[1], {'type': 'user', 'username': 'writer'})
+
+    def test_export_views_are_streamed_and_protected(self):
+
+        response = self.client.get(reverse('posts:export'))
+
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        records = self.parse(response.streaming_content)
+        self.assertEqual(
+            sum(record['type'] == 'post' for record in records), 1
+        )
+        response = self.client.get(reverse('posts:export_all'))
+        self.assertEqual(response.status_code, 302)
+        response = Client().get(reverse('posts:export'))
+        self.assertEqual(response.status_code, 302)
+
+    def test_site_export_round_trips_through_import(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'yatube.jsonl.gz')
+        call_command('export_yatube', path, stdout=StringIO())
+        User.objects.all().delete()
+        Group.objects.all().delete()
+
+        call_command('import_yatube', path, stdout=StringIO())
+
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual(post.group.slug, 'prose')
+        self.assertEqual(post.pub_date, self.post.pub_date)
+        self.assertEqual(post.comments.get().author.username, 'reader')
+        self.assertEqual(
+            Post.objects.get(pk=self.own_post.pk).comments.get().text,
+            'К своему',
+        )
+        self.assertTrue(Follow.objects.filter(
+            user__username='reader', author__username='writer'
+        ).exists())
+
+    def test_gzip_stream_is_incremental(self):
+        lines = (f'{number:08d}\n' for number in range(100000))
+
+        chunks = list(exports.gzip_stream(lines))
+
+        self.assertGreater(len(chunks), 2)
+        self.assertEqual(len(gzip.decompress(b''.join(chunks))), 900000)
+
+
+class RankingTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание',
+        )
+        cls.empty = Group.objects.create(
+            title='Пустая', slug='empty', description='Описание',
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.now = timezone.now()
+
+    def post(self, text, hours, comments=0, group=None):
+        post = Post.objects.create(
+            text=text, author=self.author, group=group
+        )
+        Post.objects.filter(pk=post.pk).update(
+            pub_date=self.now - timezone.timedelta(hours=hours),
+            comments_count=comments,
+        )
+        return post
+
+    def test_score_prefers_discussed_and_recent(self):
+        gravity = ranking.KINDS['trending']['gravity']
+
+        self.assertGreater(
+            ranking.score(5, 0, 10, gravity), ranking.score(0, 0, 10, gravity)
+        )
+        self.assertGreater(
+            ranking.score(5, 0, 1, gravity), ranking.score(5, 0, 30, gravity)
+        )
+        self.assertGreater(
+            ranking.score(0, 100, 10, gravity),
+            ranking.score(0, 0, 10, gravity),
+        )
+
+    def test_refresh_orders_site_and_group_feeds(self):
+        quiet = self.post('Тихий', hours=1)
+        discussed = self.post('Обсуждаемый', hours=1, comments=10,
+                              group=self.group)
+        stale = self.post('Старый', hours=24 * 5, comments=50)
+
+        feeds = ranking.refresh('trending', self.now)
+
+        self.assertEqual(feeds[ranking.SITE], [discussed.pk, quiet.pk])
+        self.assertEqual(feeds['group'], [discussed.pk])
+        self.assertEqual(feeds['empty'], [])
+        self.assertIn(stale.pk, ranking.post_ids('popular'))
+        self.assertEqual(
+            list(cache.get(ranking.key('trending', 'group'))), [discussed.pk]
+        )
+
+    def test_feed_is_served_from_precomputed_ids(self):
+        first = self.post('Первый', hours=2, comments=3, group=self.group)
+        second = self.post('Второй', hours=2)
+        ranking.refresh('popular', self.now)
+
+        with patch.object(ranking, 'compute') as compute:
+            response = self.client.get(reverse('posts:popular'))
+
+        compute.assert_not_called()
+        self.assertEqual(
+            [post.pk for post in response.context['page_obj']],
+            [first.pk, second.pk],
+        )
+        response = self.client.get(
+            reverse('posts:group_trending', args=['group'])
+        )
+        self.assertEqual(
+            [post.pk for post in response.context['page_obj']], [first.pk]
+        )
+        self.assertEqual(
+            response.context['title'], 'В тренде в группе Группа'
+        )
+        response = self.client.get(
+            reverse('posts:group_popular', args=['missing'])
+        )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_feed_is_paginated_by_cursor(self):
+        for number in range(12):
+            self.post(f'Пост {number}', hours=number + 1)
+        ranking.refresh('popular', self.now)
+
+        response = self.client.get(reverse('posts:popular'))
+        page = response.context['page_obj']
+        self.assertEqual(len(page), 10)
+        response = self.client.get(
+            reverse('posts:popular'), {'cursor': page.next_cursor}
+        )
+
+        self.assertEqual(
+            [post.text for post in response.context['page_obj']],
+            ['Пост 10', 'Пост 11'],
+        )
+
+    def test_lost_feed_is_recomputed_alone_by_one_request(self):
+        post = self.post('Пост', hours=1, group=self.group)
+
+        self.assertEqual(ranking.post_ids('trending', 'group'), [post.pk])
+        self.assertIsNone(cache.get(ranking.key('trending')))
+        self.assertIsNone(cache.get(ranking.key('popular', 'group')))
+
+        cache.delete(ranking.key('trending', 'group'))
+        cache.add(ranking.key('trending', 'group') + ':lock', True)
+        with patch.object(ranking, 'compute_feed') as compute_feed:
+            self.assertEqual(ranking.post_ids('trending', 'group'), [])
+        compute_feed.assert_not_called()
+
+    def test_refresh_resets_cached_pages(self):
+        self.client.get(reverse('posts:trending'))
+        post = self.post('Свежий', hours=1)
+
+        call_command('rank_posts', 'trending', stdout=StringIO())
+
+        response = self.client.get(reverse('posts:trending'))
+        self.assertEqual(
+            [item.pk for item in response.context['page_obj']], [post.pk]
+        )
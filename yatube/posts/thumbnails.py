@@ -0,0 +1,88 @@
+"""Превью картинок постов, подготовленные заранее.
+
+После сохранения поста с новой картинкой превью всех геометрий из
+settings.POST_THUMBNAILS и адаптивные варианты (posts.images)
+нарезаются в фоновом пуле потоков, а их адреса записываются в
+Post.thumbnails. Шаблоны берут готовые адреса и Pillow при выводе ленты
+не трогают; пока превью нет, показывается оригинал.
+"""
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.db.models import F
+from sorl.thumbnail import get_thumbnail
+
+from core.cache import bump
+from core.profiling import task, timed
+from core.sqlite import in_memory_db
+
+from . import images, scopes
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails',
+            )
+        return _executor
+
+
+def schedule(post_id):
+    """Ставит нарезку превью в пул после коммита текущей транзакции."""
+    transaction.on_commit(lambda: submit(post_id))
+
+
+def submit(post_id):
+    if not settings.THUMBNAIL_WORKERS or in_memory_db(connection):
+        _generate_logged(post_id)
+        return
+    executor().submit(_run, post_id)
+
+
+@task('thumbnails')
+def _run(post_id):
+    try:
+        _generate_logged(post_id)
+    finally:
+        # У потока пула своё соединение с базой, не оставляем его висеть.
+        connections.close_all()
+
+
+def _generate_logged(post_id):
+    try:
+        generate(post_id)
+    except Exception:
+        logger.exception('Не удалось нарезать превью поста %s', post_id)
+
+
+def generate(post_id):
+    """Нарезает превью и сохраняет их адреса в посте."""
+    post = Post.objects.select_related('author').filter(pk=post_id).first()
+    if post is None or not post.image:
+        return False
+    with timed('thumbnail'):
+        urls = {
+            alias: get_thumbnail(post.image, geometry, **options).url
+            for alias, (geometry, options) in settings.POST_THUMBNAILS.items()
+        }
+        urls['variants'] = images.build_variants(post.image)
+    # Если картинку успели заменить, её превью нарежет свой запуск.
+    updated = Post.objects.filter(pk=post.pk, image=post.image.name).update(
+        thumbnails=json.dumps(urls), version=F('version') + 1
+    )
+    if updated:
+        bump(*scopes.for_post(post, post.group_id))
+    return bool(updated)
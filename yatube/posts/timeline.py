@@ -0,0 +1,198 @@
+"""Лента подписок, собранная заранее (fan-out on write).
+
+Новый пост сразу раскладывается по лентам подписчиков автора, а
+подписка переносит в ленту последние посты автора. Лента читается
+одним диапазоном по индексу (user, pub_date).
+
+Авторов с очень большим числом подписчиков не раскладываем: их посты
+подмешиваются в ленту при чтении прямо из таблицы постов.
+"""
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import F
+
+from .models import (
+    LISTING_FIELDS, Follow, Post, TimelineEntry, UserStats
+)
+
+FANOUT_LIMIT = 1000  # подписчиков, после которых пост не раскладывается
+BACKFILL_LIMIT = 1000  # постов автора, переносимых в ленту при подписке
+BATCH_SIZE = 1000
+AUTHORS_BATCH = 500  # id авторов в одном IN (...)
+
+ORDERING = ('-pub_date', '-post_id')
+
+CELEBRITIES_KEY = 'timeline:celebrities'
+
+
+def celebrities():
+    """id авторов, посты которых читаются без раскладки по лентам."""
+    authors = cache.get(CELEBRITIES_KEY)
+    if authors is None:
+        authors = set(
+            UserStats.objects.filter(
+                followers_count__gt=FANOUT_LIMIT
+            ).values_list('user_id', flat=True)
+        )
+        cache.set(CELEBRITIES_KEY, authors, None)
+    return authors
+
+
+def is_celebrity(author_id):
+    return author_id in celebrities()
+
+
+def fan_out(post):
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    if is_celebrity(post.author_id):
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+            for user_id in followers.iterator()
+        ),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def subscribe(user_id, author_id):
+    """Переносит в ленту подписчика последние посты автора."""
+    subscribe_many(user_id, [author_id])
+
+
+def subscribe_many(user_id, author_ids):
+    """Переносит в ленту последние посты нескольких авторов разом.
+
+    Записи переносит сама база, INSERT … SELECT по AUTHORS_BATCH
+    авторов, с тем же ограничением BACKFILL_LIMIT, что и rebuild_all.
+    """
+    authors = sorted(set(author_ids) - celebrities())
+    ops = connection.ops
+    with connection.cursor() as cursor:
+        for start in range(0, len(authors), AUTHORS_BATCH):
+            batch = authors[start:start + AUTHORS_BATCH]
+            placeholders = ', '.join(['%s'] * len(batch))
+            cursor.execute(
+                f'{ops.insert_statement(ignore_conflicts=True)} '
+                f'{TimelineEntry._meta.db_table} (user_id, post_id, pub_date) '
+                f'SELECT %s, id, pub_date FROM ('
+                f'SELECT id, pub_date, ROW_NUMBER() OVER ('
+                f'PARTITION BY author_id ORDER BY pub_date DESC, id DESC'
+                f') AS position FROM {Post._meta.db_table} '
+                f'WHERE author_id IN ({placeholders})'
+                f') ranked WHERE position <= %s '
+                f'{ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)}',
+                [user_id, *batch, BACKFILL_LIMIT],
+            )
+
+
+def unsubscribe(user_id, author_id):
+    unsubscribe_many(user_id, [author_id])
+
+
+def unsubscribe_many(user_id, author_ids):
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id__in=author_ids
+    ).delete()
+
+
+def followers_changed(author_id):
+    """Пересчитывает статус автора после подписки или отписки.
+
+    Автор, опустившийся ниже порога, снова раскладывается по лентам:
+    подписчики, пришедшие к нему за это время, получают его посты.
+    """
+    followers_changed_many([author_id])
+
+
+def followers_changed_many(author_ids):
+    was_celebrities = celebrities() & set(author_ids)
+    now_celebrities = set(
+        UserStats.objects.filter(
+            user_id__in=author_ids, followers_count__gt=FANOUT_LIMIT
+        ).values_list('user_id', flat=True)
+    )
+    if was_celebrities == now_celebrities:
+        return
+    cache.delete(CELEBRITIES_KEY)
+    for author_id in was_celebrities - now_celebrities:
+        followers = Follow.objects.filter(
+            author_id=author_id
+        ).values_list('user_id', flat=True)
+        for user_id in followers.iterator():
+            subscribe(user_id, author_id)
+
+
+def rebuild(user):
+    """Собирает ленту пользователя заново по его подпискам."""
+    with transaction.atomic():
+        TimelineEntry.objects.filter(user=user).delete()
+        authors = Follow.objects.filter(user=user).values_list(
+            'author_id', flat=True
+        )
+        subscribe_many(user.pk, authors)
+
+
+def rebuild_all():
+    """Собирает все ленты заново одним запросом (после массовой загрузки).
+
+    Те же правила, что у fan_out и subscribe: посты знаменитостей не
+    раскладываются, от автора переносится не больше BACKFILL_LIMIT
+    последних постов. Счётчики подписчиков (UserStats) должны быть
+    актуальны. Возвращает число записей в лентах.
+    """
+    cache.delete(CELEBRITIES_KEY)
+    # Читатели видят старые ленты, пока не готовы новые.
+    with transaction.atomic():
+        TimelineEntry.objects.all().delete()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {TimelineEntry._meta.db_table} '
+                f'(user_id, post_id, pub_date) '
+                f'SELECT follow.user_id, ranked.id, ranked.pub_date '
+                f'FROM {Follow._meta.db_table} follow JOIN ('
+                f'SELECT id, author_id, pub_date, ROW_NUMBER() OVER ('
+                f'PARTITION BY author_id ORDER BY pub_date DESC, id DESC'
+                f') AS position FROM {Post._meta.db_table}'
+                f') ranked ON ranked.author_id = follow.author_id '
+                f'WHERE ranked.position <= %s AND follow.author_id NOT IN ('
+                f'SELECT user_id FROM {UserStats._meta.db_table} '
+                f'WHERE followers_count > %s)',
+                [BACKFILL_LIMIT, FANOUT_LIMIT],
+            )
+            return cursor.rowcount
+
+
+def sources(user):
+    """Источники ленты для KeysetPaginator с ключом ORDERING."""
+    result = [
+        TimelineEntry.objects.filter(user=user).select_related(
+            'post__author', 'post__group'
+        ).only(
+            'pub_date', 'post',
+            *(f'post__{field}' for field in LISTING_FIELDS)
+        )
+    ]
+    authors = celebrities()
+    if authors:
+        followed = Follow.objects.filter(
+            user=user, author_id__in=authors
+        ).values('author_id')
+        result.append(
+            Post.objects.for_listing().filter(
+                author_id__in=followed
+            ).annotate(post_id=F('pk'))
+        )
+    return result
+
+
+def posts(page):
+    """Заменяет записи ленты на страницах паджинатора их постами."""
+    return [
+        item.post if isinstance(item, TimelineEntry) else item
+        for item in page
+    ]
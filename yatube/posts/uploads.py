@@ -0,0 +1,89 @@
+"""Потоковая проверка загружаемых картинок.
+
+ImageUploadHandler стоит первым в FILE_UPLOAD_HANDLERS и видит каждый
+кусок файла раньше, чем его сохранят в память или во временный файл.
+Размеры картинки он читает из заголовка, не декодируя пиксели, и
+отбрасывает файл, как только тот превысил лимит по байтам или
+пикселям. Остальной файл собирают штатные обработчики Django: мелкий —
+в памяти, крупный — во временном файле, который потом переносится в
+MEDIA_ROOT без копирования.
+"""
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile
+from django.template.defaultfilters import filesizeformat
+from PIL import Image
+
+HEADER_LIMIT = 256 * 1024  # заголовок JPEG с EXIF может быть длинным
+
+
+class ImageUploadHandler(FileUploadHandler):
+
+    def new_file(self, field_name, file_name, content_type,
+                 content_length, charset=None, content_type_extra=None):
+        super().new_file(
+            field_name, file_name, content_type, content_length,
+            charset, content_type_extra,
+        )
+        self.received = 0
+        self.header = b''
+        self.header_checked = False
+        if content_length and content_length > settings.POST_IMAGE_MAX_SIZE:
+            self.reject(self.too_large_message())
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.POST_IMAGE_MAX_SIZE:
+            self.reject(self.too_large_message())
+        if not self.header_checked:
+            self.header += raw_data
+            self.check_header()
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
+
+    def check_header(self):
+        try:
+            # Image.open читает только заголовок, пиксели не декодируются.
+            with Image.open(BytesIO(self.header)) as image:
+                width, height = image.size
+        except Image.DecompressionBombError:
+            self.reject(self.too_many_pixels_message())
+        except Exception:
+            # Заголовок ещё не пришёл целиком или это не картинка:
+            # во втором случае файл отклонит поле формы.
+            if len(self.header) >= HEADER_LIMIT:
+                self.header_checked = True
+                self.header = b''
+            return
+        self.header_checked = True
+        self.header = b''
+        if width * height > settings.POST_IMAGE_MAX_PIXELS:
+            self.reject(self.too_many_pixels_message())
+
+    def reject(self, message):
+        if not hasattr(self.request, 'upload_errors'):
+            self.request.upload_errors = {}
+        self.request.upload_errors[self.field_name] = message
+        raise SkipFile
+
+    @staticmethod
+    def too_large_message():
+        size = filesizeformat(settings.POST_IMAGE_MAX_SIZE)
+        return f'Файл больше {size}.'
+
+    @staticmethod
+    def too_many_pixels_message():
+        return (
+            'Картинка слишком большая: не больше '
+            f'{settings.POST_IMAGE_MAX_PIXELS // 10 ** 6} мегапикселей.'
+        )
+
+
+def upload_errors(request):
+    """Ошибки файлов, отброшенных ImageUploadHandler в этом запросе."""
+    # Файлы разбираются лениво: до обращения к FILES ошибок ещё нет.
+    request.FILES
+    return getattr(request, 'upload_errors', {})
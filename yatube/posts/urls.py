@@ -1,13 +1,29 @@
 from django.urls import path
 
 
-from . import views
+from . import api, views
 
 app_name = 'posts'
 
 urlpatterns = [
     path('', views.index, name='index'),
     path('group/<slug:slug>/', views.group_posts, name='group_list'),
+    path('search/', views.search_posts, name='search'),
+    path(
+        'popular/', views.ranked_feed, {'kind': 'popular'}, name='popular'
+    ),
+    path(
+        'trending/', views.ranked_feed, {'kind': 'trending'},
+        name='trending'
+    ),
+    path(
+        'group/<slug:slug>/popular/', views.ranked_feed,
+        {'kind': 'popular'}, name='group_popular'
+    ),
+    path(
+        'group/<slug:slug>/trending/', views.ranked_feed,
+        {'kind': 'trending'}, name='group_trending'
+    ),
     path('profile/<str:username>/', views.profile, name='profile'),
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
     path('create/', views.post_create, name='post_create'),
@@ -16,7 +32,13 @@ urlpatterns = [
         'posts/<int:post_id>/comment/',
         views.add_comment, name='add_comment'
     ),
+    path(
+        'posts/<int:post_id>/comments/',
+        views.post_comments, name='post_comments'
+    ),
     path('follow/', views.follow_index, name='follow_index'),
+    path('export/', views.export_user, name='export'),
+    path('export/all/', views.export_site, name='export_all'),
     path(
         'profile/<str:username>/follow/',
         views.profile_follow,
@@ -27,4 +49,10 @@ urlpatterns = [
         views.profile_unfollow,
         name='profile_unfollow'
     ),
+    path('api/posts/', api.index, name='api_index'),
+    path('api/posts/<int:post_id>/', api.post_detail, name='api_post_detail'),
+    path('api/group/<slug:slug>/', api.group_posts, name='api_group_list'),
+    path('api/profile/<str:username>/', api.profile, name='api_profile'),
+    path('api/follow/', api.follow_index, name='api_follow_index'),
+    path('api/follow/bulk/', api.follow_bulk, name='api_follow_bulk'),
 ]
@@ -1,21 +1,68 @@
-from django.views.decorators.cache import cache_page
-from django.core.paginator import Paginator
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.contrib.auth.decorators import login_required
 
+from core.cache import cache_page_by_generations, condition_by_generations
+from core.replicas import read_from_replica
 from posts.forms import CommentForm, PostForm
 
+from . import (
+    counters, exports, ingest, ranking, scopes, search, timeline
+)
 from . models import Follow, Post, Group, User, Comment
+from . paginators import (
+    NEXT, PREVIOUS, KeysetPage, KeysetPaginator, decode_cursor, encode_cursor
+)
+from . uploads import upload_errors
 
 
 SELECT_LIMIT = 10  # количество записей на странице
+COMMENTS_LIMIT = 20  # комментариев на странице поста
+COMMENTS_ORDERING = ('created', 'id')
+PAGE_CACHE_TIMEOUT = 60 * 60  # страницы сбрасываются записью, а не временем
+SHARED_MAX_AGE = 60  # сколько CDN отдаёт анонимам страницу без сверки
 
 
-@cache_page(20, key_prefix='index_page')
+def index_scopes():
+    return [scopes.ALL_POSTS]
+
+
+def group_scopes(slug):
+    return [scopes.group(slug)]
+
+
+def profile_scopes(username):
+    return [scopes.author(username)]
+
+
+def post_scopes(post_id):
+    return [scopes.post(post_id)]
+
+
+def post_detail_scopes(post_id):
+    # Страница в кэше от числа постов автора не зависит (это дырка
+    # author_posts), а ответ целиком — зависит.
+    author = Post.objects.filter(pk=post_id).values_list(
+        'author__username', flat=True
+    ).first()
+    if author is None:
+        return post_scopes(post_id)
+    return post_scopes(post_id) + [scopes.author(author)]
+
+
+def ranked_scopes(kind, slug=None):
+    # ALL_POSTS — чтобы правки и удаления постов были видны до пересчёта.
+    return [scopes.ranking(kind, slug), scopes.ALL_POSTS]
+
+
+@condition_by_generations(index_scopes, SHARED_MAX_AGE)
+@cache_page_by_generations(PAGE_CACHE_TIMEOUT, index_scopes, shared=True)
+@read_from_replica(index_scopes)
 def index(request):
     templates = 'posts/index.html'
     title = 'Последние обновления на сайте'
-    post_list = Post.objects.select_related('author').all()
+    post_list = Post.objects.for_listing()
     context = {
         'title': title,
         'page_obj': paginator(request, post_list),
@@ -23,11 +70,14 @@ def index(request):
     return render(request, templates, context)
 
 
+@condition_by_generations(group_scopes, SHARED_MAX_AGE)
+@cache_page_by_generations(PAGE_CACHE_TIMEOUT, group_scopes, shared=True)
+@read_from_replica(group_scopes)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
     templates = 'posts/group_list.html'
     title = f'Записи сообщества {group}'
-    post_list = Post.objects.select_related('author').all()
+    post_list = Post.objects.for_listing().filter(group=group)
     context = {
         'title': title,
         'page_obj': paginator(request, post_list),
@@ -36,20 +86,55 @@ def group_posts(request, slug):
     return render(request, templates, context)
 
 
-def paginator(request, post_list):
-    paginator = Paginator(post_list, SELECT_LIMIT)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+@read_from_replica()
+def search_posts(request):
+    query = request.GET.get('q', '').strip()
+    context = {
+        'title': 'Поиск',
+        'query': query,
+        'results': search.search(query) if query else [],
+    }
+    return render(request, 'posts/search.html', context)
+
+
+def paginator(request, post_list, per_page=SELECT_LIMIT, **kwargs):
+    paginator = KeysetPaginator(post_list, per_page, **kwargs)
+    cursor = request.GET.get('cursor')
+    page_obj = paginator.get_page(cursor)
     return page_obj
 
 
+def ranked_page(request, post_ids, per_page=SELECT_LIMIT):
+    """Страница готового списка id: курсор хранит смещение в нём."""
+    token = request.GET.get('cursor')
+    cursor = decode_cursor(token) if token else None
+    offset = 0
+    if cursor is not None:
+        try:
+            offset = max(int(cursor[1][0]), 0)
+        except (IndexError, ValueError):
+            pass
+    page_ids = post_ids[offset:offset + per_page]
+    posts = Post.objects.for_listing().in_bulk(page_ids)
+    end = offset + per_page
+    return KeysetPage(
+        [posts[pk] for pk in page_ids if pk in posts],
+        None,
+        encode_cursor(NEXT, [end]) if end < len(post_ids) else None,
+        encode_cursor(PREVIOUS, [max(offset - per_page, 0)])
+        if offset else None,
+    )
+
+
+@condition_by_generations(profile_scopes, SHARED_MAX_AGE)
+@cache_page_by_generations(PAGE_CACHE_TIMEOUT, profile_scopes, shared=True)
+@read_from_replica(profile_scopes)
 def profile(request, username):
     author = get_object_or_404(User, username=username)
-    author_post = Post.objects.select_related('author').filter(
-        author_id=author
-    )
-    count_post = author_post.count()
-    count_follower = Follow.objects.filter(author=author).count()
+    author_post = Post.objects.for_listing().filter(author=author)
+    stats = counters.stats(author)
+    count_post = stats.posts_count
+    count_follower = stats.followers_count
     title = f'Профайл пользователя {username}'
 
     context = {
@@ -59,43 +144,78 @@ def profile(request, username):
         'count_post': count_post,
         'count_follower': count_follower,
     }
-
-    if request.user.is_authenticated:
-        following = Follow.objects.filter(
-            user=request.user,
-            author=User.objects.get(username=username)
-        )
-        context.update({'following': following})
-        return render(request, 'posts/profile.html', context)
     return render(request, 'posts/profile.html', context)
 
 
+@condition_by_generations(post_detail_scopes, SHARED_MAX_AGE)
+@cache_page_by_generations(PAGE_CACHE_TIMEOUT, post_scopes, shared=True)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
-    count_post = post.author.posts.count()
+    post = get_object_or_404(
+        Post.objects.select_related('author', 'group'), pk=post_id
+    )
     form = CommentForm()
-    comments = Comment.objects.select_related('post').filter(post=post_id)
+    comments = comments_page(request, post.pk)
     context = {
         'comments': comments,
         'form': form,
         'post': post,
-        'count_post': count_post,
         'title': post,
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+def comments_page(request, post_id):
+    return paginator(
+        request,
+        Comment.objects.select_related('author').filter(post_id=post_id),
+        per_page=COMMENTS_LIMIT,
+        ordering=COMMENTS_ORDERING,
+    )
+
+
+def post_comments(request, post_id):
+    """Следующая страница комментариев для кнопки «Показать ещё»:
+    HTML-фрагмент или JSON при ?format=json."""
+    comments = comments_page(request, post_id)
+    if not comments and not Post.objects.filter(pk=post_id).exists():
+        raise Http404
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'comments': [
+                {
+                    'id': comment.pk,
+                    'author': comment.author.username,
+                    'text': comment.text,
+                    'created': comment.created.isoformat(),
+                }
+                for comment in comments
+            ],
+            'next_cursor': comments.next_cursor,
+        })
+    return render(
+        request,
+        'posts/includes/comments.html',
+        {'comments': comments, 'post_id': post_id},
+    )
+
+
 @ login_required
 def post_create(request):
     author = Post(author=request.user)
     form = PostForm(
         request.POST or None,
         files=request.FILES or None,
-        instance=author
+        instance=author,
+        upload_errors=upload_errors(request),
     )
     if request.method != 'POST' or not form.is_valid():
         return render(request, 'posts/create_post.html', {'form': form})
-    form.save()
+    post = form.save(commit=False)
+    if post.image:
+        # Файл загрузки живёт только до конца запроса.
+        post.save()
+    else:
+        ingest.save(post, request.user.pk)
     return redirect('posts:profile', username=request.user)
 
 
@@ -105,7 +225,8 @@ def post_edit(request, post_id):
     form = PostForm(
         request.POST or None,
         files=request.FILES or None,
-        instance=post
+        instance=post,
+        upload_errors=upload_errors(request),
     )
     if request.user != post.author:
         return redirect('posts:post_detail', post_id=post_id)
@@ -114,7 +235,12 @@ def post_edit(request, post_id):
                       'posts/create_post.html',
                       {'form': form, 'is_edit': True}
                       )
-    form.save()
+    # Только изменённые поля: превью, которые успела записать фоновая
+    # нарезка, полное сохранение затёрло бы старыми.
+    fields = set(form.changed_data)
+    if 'image' in fields:
+        fields.add('thumbnails')
+    form.save(commit=False).save(update_fields=fields)
     return redirect('posts:post_detail', post_id=post_id)
 
 
@@ -126,17 +252,39 @@ def add_comment(request, post_id):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        ingest.save(comment, request.user.pk)
     return redirect('posts:post_detail', post_id=post_id)
 
 
+@condition_by_generations(ranked_scopes, SHARED_MAX_AGE)
+@cache_page_by_generations(PAGE_CACHE_TIMEOUT, ranked_scopes, shared=True)
+@read_from_replica(ranked_scopes)
+def ranked_feed(request, kind, slug=None):
+    group = get_object_or_404(Group, slug=slug) if slug else None
+    titles = {'popular': 'Популярное', 'trending': 'В тренде'}
+    title = titles[kind]
+    if group is not None:
+        title = f'{title} в группе {group.title}'
+    context = {
+        'title': title,
+        'kind': kind,
+        'group': group,
+        'page_obj': ranked_page(request, ranking.post_ids(kind, slug)),
+    }
+    return render(request, 'posts/ranked.html', context)
+
+
 @ login_required
+@read_from_replica()
 def follow_index(request):
     title = 'Лента избранных авторов'
-    post_list = Post.objects.filter(author__following__user=request.user)
+    page_obj = paginator(
+        request, timeline.sources(request.user), ordering=timeline.ORDERING
+    )
+    page_obj.object_list = timeline.posts(page_obj)
     context = {
         'title': title,
-        'page_obj': paginator(request, post_list),
+        'page_obj': page_obj,
     }
     return render(request, 'posts/follow.html', context)
 
@@ -155,3 +303,24 @@ def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
     Follow.objects.filter(user=request.user, author=author).delete()
     return redirect('posts:profile', username=author)
+
+
+def export_response(user, filename):
+    response = StreamingHttpResponse(
+        exports.export(user), content_type='application/gzip'
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response['Cache-Control'] = 'private, no-store'
+    return response
+
+
+@ login_required
+def export_user(request):
+    return export_response(
+        request.user, f'yatube-{request.user.username}.jsonl.gz'
+    )
+
+
+@staff_member_required
+def export_site(request):
+    return export_response(None, 'yatube.jsonl.gz')
@@ -37,11 +37,15 @@ INTERNAL_IPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.profiling.ProfilingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'core.replicas.ReplicaPinMiddleware',
+    'posts.ingest.WaitForOwnWritesMiddleware',
+    'core.holes.HolePunchMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     # 'debug_toolbar.middleware.DebugToolbarMiddleware',
 ]
@@ -51,7 +55,8 @@ ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates, время отрисовки которых видно профилировщику
+        'BACKEND': 'core.profiling.ProfiledDjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -72,12 +77,59 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
+# База задаётся переменными окружения DB_*; без них — SQLite рядом с
+# проектом. Для PostgreSQL:
+#   DB_ENGINE=django.db.backends.postgresql DB_NAME=yatube DB_USER=...
+#   DB_PASSWORD=... DB_HOST=... DB_PORT=5432 (нужен psycopg2).
+# Поиск (posts/search.py) на SQLite идёт по FTS5, на PostgreSQL — по
+# to_tsvector с GIN-индексами; на других базах это LIKE по всей таблице.
+# Соединения живут DB_CONN_MAX_AGE секунд, а не один запрос. С пулом
+# PgBouncer в режиме transaction указывайте DB_POOLER=pgbouncer: пул
+# держит соединения к серверу сам, а серверные курсоры iterator() через
+# него не работают.
+# Реплика для чтения лент (core.replicas) включается переменными
+# DB_REPLICA_NAME, DB_REPLICA_HOST и т.д.; остальные значения берутся у
+# основной базы. Локально реплику можно изобразить второй SQLite-базой:
+#   DB_REPLICA_NAME=replica.sqlite3 и python manage.py sync_replica.
+
+
+def database(prefix, defaults=None):
+    defaults = defaults or {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
     }
-}
+    config = {
+        key: os.getenv(f'{prefix}_{key}', defaults.get(key, ''))
+        for key in ('ENGINE', 'NAME', 'USER', 'PASSWORD', 'HOST', 'PORT')
+    }
+    config['CONN_MAX_AGE'] = int(os.getenv('DB_CONN_MAX_AGE', 60))
+    if os.getenv('DB_POOLER') == 'pgbouncer':
+        config['DISABLE_SERVER_SIDE_CURSORS'] = True
+    return config
+
+
+DATABASES = {'default': database('DB')}
+if os.getenv('DB_REPLICA_NAME') or os.getenv('DB_REPLICA_HOST'):
+    DATABASES['replica'] = dict(
+        database('DB_REPLICA', DATABASES['default']),
+        # В тестах реплика — та же тестовая база, что и основная.
+        TEST={'MIRROR': 'default'},
+    )
+
+# PRAGMA для каждого соединения с SQLite (core/sqlite.py). Сравнить с
+# настройками по умолчанию: python manage.py benchmark_sqlite
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -20000,
+} if os.getenv('SQLITE_TUNING', '1') == '1' else {}
+
+DATABASE_ROUTERS = ['core.replicas.ReplicaRouter']
+# Сколько секунд после записи пользователь читает с основной базы,
+# пока реплика догоняет.
+REPLICA_PIN_SECONDS = 5
 
 
 # Password validation
@@ -129,8 +181,62 @@ CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Превью картинок постов: псевдоним -> (геометрия, опции sorl).
+# Нарезаются в фоне сразу после сохранения поста (posts.thumbnails).
+POST_THUMBNAILS = {
+    'card': ('960x339', {'crop': 'center', 'upscale': True}),
+}
+THUMBNAIL_WORKERS = 2  # 0 — резать сразу после коммита в потоке запроса
+# Загрузки: картинки проверяются по заголовку ещё в потоке загрузки,
+# файлы больше FILE_UPLOAD_MAX_MEMORY_SIZE уходят во временный файл.
+# FILE_UPLOAD_TEMP_DIR лучше держать на одном диске с MEDIA_ROOT, тогда
+# файл переносится в хранилище переименованием, без копирования.
+FILE_UPLOAD_HANDLERS = [
+    'posts.uploads.ImageUploadHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+FILE_UPLOAD_MAX_MEMORY_SIZE = 1024 * 1024
+FILE_UPLOAD_TEMP_DIR = os.getenv('FILE_UPLOAD_TEMP_DIR')
+POST_IMAGE_MAX_SIZE = 10 * 1024 * 1024
+POST_IMAGE_MAX_PIXELS = 40 * 10 ** 6
+
+# Отложенная запись постов без картинок и комментариев (posts/ingest.py)
+WRITE_BEHIND = os.getenv('WRITE_BEHIND', '') == '1'
+WRITE_BEHIND_BATCH_SIZE = 100
+WRITE_BEHIND_FLUSH_INTERVAL = 0.1  # секунд ожидания пачки
+WRITE_BEHIND_QUEUE_SIZE = 10000  # дальше view пишет в базу сам
+WRITE_BEHIND_SYNC = False  # True — без фонового потока, пишет drain()
+
+# Профилирование доли запросов (core/profiling.py); отчёт для персонала
+# на /profiling/, метрики Prometheus на /profiling/metrics. Сборщик
+# метрик вместо входа передаёт Authorization: Bearer <PROFILING_TOKEN>.
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', 0.01))
+PROFILING_BUFFER_SIZE = 1000  # последних замеров в памяти процесса
+PROFILING_TOKEN = os.getenv('PROFILING_TOKEN', '')
+
+# Адаптивные варианты кадра карточки (posts.images) для srcset
+POST_IMAGE_WIDTHS = (320, 640, 960)
+POST_IMAGE_RATIO = (960, 339)
+
+# L2 общий для всех воркеров: в проде memcached или Redis, например
+# CACHE_BACKEND=django.core.cache.backends.memcached.MemcachedCache
+# и CACHE_LOCATION=127.0.0.1:11211. Перед ним у каждого воркера свой L1.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+        'BACKEND': 'core.cache_backends.TieredCache',
+        'LOCATION': 'shared',
+        'OPTIONS': {
+            'L1_MAX_ENTRIES': 1000,
+            'L1_TIMEOUT': 30,
+            # Насколько L1 может отставать от записей других воркеров.
+            'SYNC_INTERVAL': 1,
+        },
+    },
+    'shared': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    },
 }
@@ -0,0 +1,11 @@
+"""Настройки тестов.
+
+Тестовая база — SQLite в памяти, которую потоки делят через shared
+cache: чужая блокировка таблицы там сразу даёт ошибку. Поэтому фоновые
+задачи выполняются в потоке запроса. На такой базе их не запускает и код
+(core.sqlite.in_memory_db) — на случай тестов с yatube.settings.
+"""
+from .settings import *  # noqa: F401,F403
+
+THUMBNAIL_WORKERS = 0
+WRITE_BEHIND_SYNC = True
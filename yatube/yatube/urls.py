@@ -9,6 +9,7 @@ urlpatterns = [
     path('about/', include('about.urls', namespace='about')),
     path('auth/', include('users.urls', namespace='users')),
     path('auth/', include('django.contrib.auth.urls')),
+    path('profiling/', include('core.urls', namespace='core')),
     path('', include('posts.urls', namespace='posts'))
 ]
 